@@ -5,20 +5,24 @@ from fastapi import FastAPI, HTTPException, UploadFile, File, BackgroundTasks, D
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 from typing import Optional, Dict, Any, List
-from datetime import datetime
+from datetime import datetime, timezone
 import os
 import uuid
 import json
 import hashlib
+import hmac
 import threading
 
-from supabase import create_client, Client
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 from services.assembly_service import AssemblyAIService
-from services.download_service import DownloadService
-from services.supabase_service import insert_transcription, update_transcription
+from services.download_service import DownloadService, FILE_HASH_ALGO, find_ffmpeg, find_ffprobe
+from services.supabase_service import insert_transcription, update_transcription, update_transcription_by_job_id
 from services.openai_service import gpt_4_completion
-from middleware.auth import get_current_user, get_current_user_or_service, get_current_user_optional
+from middleware.auth import get_current_user, get_current_user_or_service, get_current_user_optional, is_owner_or_admin
 
 
 class TranscriptionRequest(BaseModel):
@@ -59,16 +63,30 @@ app.add_middleware(
 )
 
 
-"""Idempotência e cliente Supabase"""
-SUPABASE_URL = os.getenv("SUPABASE_URL")
-SUPABASE_KEY = os.getenv("SUPABASE_KEY")
-_supabase_client: Optional[Client] = None
-try:
-    if SUPABASE_URL and SUPABASE_KEY:
-        _supabase_client = create_client(SUPABASE_URL, SUPABASE_KEY)
-except Exception:
-    _supabase_client = None
+@app.on_event("startup")
+def _check_ffmpeg():
+    """Resolve ffmpeg/ffprobe uma vez na inicialização; a ausência deve ser corrigida na imagem (nixpacks.toml)"""
+    ffmpeg_path, ffprobe_path = find_ffmpeg(), find_ffprobe()
+    if ffmpeg_path and ffprobe_path:
+        print(f"[STARTUP] FFmpeg: {ffmpeg_path} | FFprobe: {ffprobe_path}")
+    else:
+        print("[STARTUP] ⚠️ FFmpeg/FFprobe não encontrados: instale-os no build da imagem (nixpacks.toml); "
+              "extração de áudio e cortes de vídeo vão falhar")
+
+
+def _dumps(value: Any) -> str:
+    """Serializa campos JSON das colunas de texto (orjson quando disponível)"""
+    if orjson is not None:
+        return orjson.dumps(value).decode("utf-8")
+    return json.dumps(value)
+
 
+"""Idempotência"""
+# Jobs rodam em BackgroundTasks do processo: se o worker for reciclado no meio, o registro fica em
+# "processing" para sempre. Passado este tempo (download + espera máxima da transcrição), ele não deduplica mais.
+JOB_TIMEOUT_SECONDS = 2 * 60 * 60
+# Registros candidatos avaliados por hash (o mais recente pode ser um job abandonado)
+_DEDUPE_CANDIDATES = 5
 _locks_guard = threading.Lock()
 _hash_locks: Dict[str, threading.Lock] = {}
 
@@ -86,8 +104,28 @@ def _sha256_str(value: str) -> str:
     return hashlib.sha256((value or "").strip().encode("utf-8")).hexdigest()
 
 
+def _is_stale_job(row: Dict[str, Any]) -> bool:
+    """True se o registro está em 'processing' há mais que JOB_TIMEOUT_SECONDS (job perdido num restart)"""
+    if row.get("status") != "processing":
+        return False
+    timestamp = row.get("updated_at") or row.get("created_at")
+    if not timestamp:
+        return False
+    try:
+        started = datetime.fromisoformat(str(timestamp).replace("Z", "+00:00"))
+    except ValueError:
+        return False
+    if started.tzinfo is None:
+        started = started.replace(tzinfo=timezone.utc)
+    return (datetime.now(timezone.utc) - started).total_seconds() > JOB_TIMEOUT_SECONDS
+
+
 def _find_transcription_by_hash(url_hash: str) -> Optional[Dict[str, Any]]:
-    """Busca transcrição por hash usando SERVICE_ROLE para bypass RLS"""
+    """Busca transcrição por hash usando SERVICE_ROLE para bypass RLS
+
+    Só considera jobs concluídos ou ainda em andamento: falhas e jobs abandonados
+    (em 'processing' além de JOB_TIMEOUT_SECONDS) não bloqueiam um novo envio.
+    """
     if not url_hash:
         return None
     try:
@@ -96,21 +134,75 @@ def _find_transcription_by_hash(url_hash: str) -> Optional[Dict[str, Any]]:
         res = (
             supabase
             .table("transcriptions")
-            .select("id, job_id, status")
+            .select("id, job_id, status, created_at, updated_at")
             .eq("url_hash", url_hash)
+            .in_("status", ["processing", "completed"])
             .order("created_at", desc=True)
-            .limit(1)
+            .limit(_DEDUPE_CANDIDATES)
             .execute()
         )
-        data = getattr(res, "data", None)
-        if data and len(data) > 0:
-            return data[0]
+        for row in getattr(res, "data", None) or []:
+            if not _is_stale_job(row):
+                return row
     except Exception as e:
         print(f"[DEBUG] Erro ao buscar transcrição por hash: {e}")
         return None
     return None
 
 
+_JOB_COLUMNS = "id, job_id, status, title, user_id, url_hash, updated_at"
+
+
+def _find_transcription_by_job_id(job_id: str) -> Optional[Dict[str, Any]]:
+    """Busca transcrição por job_id usando SERVICE_ROLE para bypass RLS"""
+    try:
+        from services.supabase_service import get_supabase_service_client
+        supabase = get_supabase_service_client()
+    except Exception as e:
+        print(f"[DEBUG] Erro ao buscar transcrição por job_id: {e}")
+        return None
+    # Esquemas sem a coluna error_message: repetir a busca sem ela
+    for columns in (f"{_JOB_COLUMNS}, error_message", _JOB_COLUMNS):
+        try:
+            res = (
+                supabase
+                .table("transcriptions")
+                .select(columns)
+                .eq("job_id", job_id)
+                .limit(1)
+                .execute()
+            )
+            data = getattr(res, "data", None)
+            return data[0] if data else None
+        except Exception as e:
+            print(f"[DEBUG] Erro ao buscar transcrição por job_id ({columns}): {e}")
+    return None
+
+
+def _set_job_status(job_id: str, status: str, message: str, extra: Optional[Dict[str, Any]] = None,
+                    supabase_url: Optional[str] = None, service_key: Optional[str] = None):
+    """Grava o status final de um job que não chegou a ser transcrito (com a mensagem em error_message)"""
+    data = {"status": status, **(extra or {})}
+    try:
+        update_transcription_by_job_id(
+            job_id, {**data, "error_message": str(message)[:2000]},
+            supabase_url=supabase_url, service_key=service_key
+        )
+    except Exception as e:
+        # Esquema sem a coluna error_message: gravar ao menos o status
+        print(f"[BACKGROUND] Erro ao gravar mensagem do job ({e}); atualizando apenas o status")
+        try:
+            update_transcription_by_job_id(job_id, data, supabase_url=supabase_url, service_key=service_key)
+        except Exception as e2:
+            print(f"[BACKGROUND] Erro ao marcar job {job_id} como '{status}': {e2}")
+
+
+def _mark_job_failed(job_id: str, error: str, supabase_url: Optional[str] = None, service_key: Optional[str] = None):
+    """Marca o job como 'error' para que não fique em 'processing' para sempre nem bloqueie a deduplicação"""
+    print(f"[BACKGROUND] Job {job_id} falhou: {error}")
+    _set_job_status(job_id, "error", error, supabase_url=supabase_url, service_key=service_key)
+
+
 def _extract_json_from_text(text: str) -> dict:
     try:
         return json.loads(text)
@@ -209,13 +301,14 @@ REGRAS IMPORTANTES:
     risks = parsed.get('risks') if isinstance(parsed.get('risks'), list) else []
     next_steps = parsed.get('next_steps') if isinstance(parsed.get('next_steps'), list) else []
 
+    now = datetime.now(timezone.utc)
     data = {
         "job_id": job_id,
         "video_url": video_url,
         "transcription": transcription_text,
         "status": "processing",
-        "created_at": datetime.utcnow().isoformat(),
-        "datetime": datetime.utcnow().date().isoformat(),
+        "created_at": now.isoformat(),
+        "datetime": now.date().isoformat(),
         "title": title,
         "reuniao": file_name,
         "user_id": user_id,
@@ -267,21 +360,21 @@ REGRAS IMPORTANTES:
         "status": "completed",
         "transcription": transcription_text,
         "executive_summary": executive_summary,
-        "decisions": json.dumps(decisions),
-        "main_points": json.dumps(main_points),
-        "action_items": json.dumps(action_items),
-        "tags": json.dumps(tags),
+        "decisions": _dumps(decisions),
+        "main_points": _dumps(main_points),
+        "action_items": _dumps(action_items),
+        "tags": _dumps(tags),
         "client": client,
         "project": project,
         "rito": rito,
         "title": title,
         "reuniao": file_name,
-        "participants": json.dumps(participants),
-        "metrics": json.dumps(metrics),
-        "dates": json.dumps(dates),
-        "risks": json.dumps(risks),
-        "next_steps": json.dumps(next_steps),
-        "updated_at": datetime.utcnow().isoformat(),
+        "participants": _dumps(participants),
+        "metrics": _dumps(metrics),
+        "dates": _dumps(dates),
+        "risks": _dumps(risks),
+        "next_steps": _dumps(next_steps),
+        "updated_at": now.isoformat(),
         "meeting_type": meeting_type or "projeto",
         # Nota: include_nlp e speaker_labels não são salvos na tabela (apenas usados durante processamento)
     }
@@ -296,35 +389,59 @@ REGRAS IMPORTANTES:
 def health():
     return {
         "status": "healthy",
-        "timestamp": datetime.utcnow().isoformat()
+        "timestamp": datetime.now(timezone.utc).isoformat()
     }
 
 
+@app.post("/api/webhooks/assemblyai")
+async def assemblyai_webhook(request: Request):
+    """Recebe o callback de conclusão da AssemblyAI e acorda o job que aguarda a transcrição"""
+    from services.assembly_service import WEBHOOK_AUTH_HEADER_NAME, WEBHOOK_SECRET
+    received = request.headers.get(WEBHOOK_AUTH_HEADER_NAME, "")
+    if not WEBHOOK_SECRET or not hmac.compare_digest(received.encode("utf-8"), WEBHOOK_SECRET.encode("utf-8")):
+        raise HTTPException(401, "Webhook não autorizado")
+    try:
+        payload = await request.json()
+    except Exception:
+        raise HTTPException(400, "Payload inválido")
+    transcript_id = payload.get("transcript_id") if isinstance(payload, dict) else None
+    if not transcript_id:
+        raise HTTPException(400, "transcript_id ausente")
+    from services.assembly_service import notify_transcript_ready
+    notified = notify_transcript_ready(transcript_id)
+    print(f"[WEBHOOK] AssemblyAI transcript_id={transcript_id} status={payload.get('status')} pendente={notified}")
+    return {"status": "ok"}
+
+
 @app.post("/api/admin/clear-cache")
 def clear_tenant_cache():
     """Limpa o cache de tenants para forçar nova busca no Registry"""
-    from middleware.tenant import _tenant_cache
-    cache_size = len(_tenant_cache)
-    _tenant_cache.clear()
+    from middleware.tenant import clear_tenant_cache as _clear_tenant_cache
+    cache_size = _clear_tenant_cache()
     return {
         "status": "success",
         "message": f"Cache limpo: {cache_size} entradas removidas",
-        "timestamp": datetime.utcnow().isoformat()
+        "timestamp": datetime.now(timezone.utc).isoformat()
     }
 
 
 @app.post("/api/transcribe")
-async def transcribe_from_url(req: TranscriptionRequest, current_user: dict = Depends(get_current_user_or_service)):
+async def transcribe_from_url(
+    req: TranscriptionRequest,
+    background_tasks: BackgroundTasks,
+    current_user: dict = Depends(get_current_user_or_service)
+):
+    """Agenda download e transcrição em background e retorna o job_id (consultar GET /api/transcribe/{job_id})
+
+    Nada de pesado roda na requisição: o download (que pode ter GBs) e a deduplicação
+    por conteúdo acontecem no job, evitando timeout do gateway.
+    """
     try:
         job_id = str(uuid.uuid4())
-        download = DownloadService()
-        dl = download.download_file(req.video_url, job_id)
-        if not dl["success"]:
-            raise HTTPException(500, f"Erro no download: {dl['error']}")
-
-        file_path = dl["file_path"]
-        file_hash = dl.get("file_hash")
-        url_hash = f"content:{file_hash}" if file_hash else f"url:{_sha256_str(req.video_url)}"
+        # Deduplicação imediata pelo URL; a por conteúdo é feita no job, após o download
+        url_hash = f"url:{_sha256_str(req.video_url)}"
+        user_id = current_user.get('id') if current_user else None
+        file_name = req.title or os.path.basename(req.video_url)
 
         # Evita duplicação dentro da mesma réplica
         lock = _get_lock_for(url_hash)
@@ -336,38 +453,130 @@ async def transcribe_from_url(req: TranscriptionRequest, current_user: dict = De
                     message="Transcrição já existente",
                     status=existing.get("status") or "done"
                 )
-        assembly = AssemblyAIService()
-        upload = assembly.upload_file(file_path)
-        if not upload.get("success"):
-            raise HTTPException(500, f"Erro no upload: {upload.get('error')}")
 
-        url = upload.get("upload_url")
-        trans = assembly.start_transcription(url)
-        if not trans.get("success"):
-            raise HTTPException(500, f"Erro ao iniciar transcrição: {trans.get('error')}")
-        final = assembly.wait_for_completion(trans.get("transcript_id"))
-        if not final.get("success"):
-            raise HTTPException(500, f"Erro na transcrição: {final.get('error')}")
+            # Registro inicial para o job ser consultável enquanto processa
+            try:
+                insert_transcription({
+                    "job_id": job_id,
+                    "video_url": req.video_url,
+                    "reuniao": file_name,
+                    "status": "processing",
+                    "created_at": datetime.now(timezone.utc).isoformat(),
+                    "url_hash": url_hash,
+                    "user_id": user_id,
+                })
+            except Exception as e:
+                print(f"[TRANSCRIBE] Erro ao criar registro inicial: {e}")
 
-        text = final["data"].get("text", "")
-        user_id = current_user.get('id') if current_user else None
-        process_and_save_transcription(
-            text,
-            job_id,
+        # Capturar credenciais do tenant antes de iniciar background task
+        from middleware.tenant import get_tenant_context
+        tenant_ctx = get_tenant_context()
+        supabase_url = tenant_ctx.get_supabase_url() if tenant_ctx.tenant_data else None
+        service_key = tenant_ctx.get_service_key() if tenant_ctx.tenant_data else None
+
+        background_tasks.add_task(
+            _process_url_transcription,
             req.video_url,
-            req.title or os.path.basename(req.video_url),
+            job_id,
+            file_name,
             user_id,
-            url_hash=url_hash,
-            meeting_type=req.meeting_type,
+            req.meeting_type,
+            supabase_url=supabase_url,
+            service_key=service_key,
         )
 
-        return TranscriptionResponse(job_id=job_id, message="Transcrição concluída e salva no Supabase", status="done")
+        print(f"[TRANSCRIBE] Transcrição agendada em background: {job_id}")
+        return TranscriptionResponse(job_id=job_id, message="Transcrição iniciada em background", status="processing")
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(500, str(e))
 
 
+def _process_url_transcription(
+    video_url: str,
+    job_id: str,
+    filename: str,
+    user_id: Optional[str],
+    meeting_type: Optional[str] = None,
+    supabase_url: Optional[str] = None,
+    service_key: Optional[str] = None
+):
+    """Baixa o arquivo do URL, deduplica pelo conteúdo e segue para a transcrição em background"""
+    try:
+        print(f"[BACKGROUND] Baixando {video_url}")
+        with DownloadService() as download:
+            dl = download.download_file(video_url, job_id)
+        if not dl["success"]:
+            _mark_job_failed(job_id, f"Erro no download: {dl['error']}", supabase_url, service_key)
+            return
+
+        file_path = dl["file_path"]
+        file_hash = dl.get("file_hash")
+        url_hash = f"url:{_sha256_str(video_url)}"
+        if file_hash:
+            # Algoritmo na chave: réplicas com/sem blake3 e registros antigos (SHA-256) nunca comparam digests diferentes
+            url_hash = f"content:{dl.get('file_hash_algo', 'sha256')}:{file_hash}"
+            lock = _get_lock_for(url_hash)
+            with lock:
+                existing = _find_transcription_by_hash(url_hash)
+                if existing and existing.get("job_id") != job_id:
+                    # Mesmo conteúdo de outro job: este job aponta para ele (GET devolve duplicate_of)
+                    os.remove(file_path)
+                    print(f"[BACKGROUND] Job {job_id} duplica o job {existing.get('job_id')}")
+                    _set_job_status(
+                        job_id, "duplicate",
+                        f"Conteúdo já transcrito no job {existing.get('job_id')} (status: {existing.get('status')})",
+                        extra={"url_hash": url_hash},
+                        supabase_url=supabase_url, service_key=service_key
+                    )
+                    return
+                # A partir daqui o job responde pela deduplicação do conteúdo
+                update_transcription_by_job_id(job_id, {"url_hash": url_hash}, supabase_url=supabase_url, service_key=service_key)
+    except Exception as e:
+        print(f"[BACKGROUND] Erro no download: {e}")
+        import traceback
+        traceback.print_exc()
+        _mark_job_failed(job_id, f"Erro no download: {e}", supabase_url, service_key)
+        return
+
+    _process_upload_transcription(
+        file_path,
+        job_id,
+        filename,
+        user_id,
+        url_hash,
+        meeting_type,
+        supabase_url=supabase_url,
+        service_key=service_key,
+        video_url=video_url,
+    )
+
+
+@app.get("/api/transcribe/{job_id}")
+def get_transcription_job(job_id: str, current_user: dict = Depends(get_current_user_or_service)):
+    """Consulta o status de um job de transcrição"""
+    record = _find_transcription_by_job_id(job_id)
+    if not record:
+        raise HTTPException(404, "Job não encontrado")
+    owner_id = record.get("user_id")
+    if owner_id and not current_user.get("is_service") and not is_owner_or_admin(current_user, owner_id):
+        raise HTTPException(404, "Job não encontrado")
+    response = {
+        "job_id": record.get("job_id"),
+        "transcription_id": record.get("id"),
+        "status": record.get("status"),
+        "title": record.get("title"),
+        "updated_at": record.get("updated_at"),
+        "error_message": record.get("error_message"),
+    }
+    if record.get("status") == "duplicate":
+        # Job original resolvido pelo hash de conteúdo (None se ele falhou: reenviar o URL)
+        original = _find_transcription_by_hash(record.get("url_hash"))
+        response["duplicate_of"] = original.get("job_id") if original and original.get("job_id") != job_id else None
+    return response
+
+
 def _process_upload_transcription(
     audio_path: str, 
     job_id: str, 
@@ -378,7 +587,8 @@ def _process_upload_transcription(
     include_nlp: bool = True,
     speaker_labels: bool = True,
     supabase_url: Optional[str] = None,
-    service_key: Optional[str] = None
+    service_key: Optional[str] = None,
+    video_url: str = "UPLOAD"
 ):
     """Processa transcrição em background para evitar timeout"""
     try:
@@ -386,13 +596,12 @@ def _process_upload_transcription(
             print(f"[BACKGROUND] Usando credenciais explícitas | URL: {supabase_url[:50]}...")
         print(f"[BACKGROUND] Iniciando processamento de {filename}")
         print(f"[BACKGROUND] Configurações: include_nlp={include_nlp}, speaker_labels={speaker_labels}")
-        download = DownloadService()
         assembly = AssemblyAIService()
         
         # Upload para AssemblyAI
         upload = assembly.upload_file(audio_path)
         if not upload.get("success"):
-            print(f"[BACKGROUND] Erro no upload: {upload.get('error')}")
+            _mark_job_failed(job_id, f"Erro no upload: {upload.get('error')}", supabase_url, service_key)
             return
         
         # ✅ Criar configuração para transcrição
@@ -407,13 +616,13 @@ def _process_upload_transcription(
         # Iniciar transcrição com configuração
         trans = assembly.start_transcription(upload.get("upload_url"), config=config)
         if not trans.get("success"):
-            print(f"[BACKGROUND] Erro ao iniciar transcrição: {trans.get('error')}")
+            _mark_job_failed(job_id, f"Erro ao iniciar transcrição: {trans.get('error')}", supabase_url, service_key)
             return
         
         # Aguardar conclusão
-        final = assembly.wait_for_completion(trans.get("transcript_id"))
+        final = assembly.wait_for_completion(trans.get("transcript_id"), hint_seconds=assembly.estimate_duration(audio_path))
         if not final.get("success"):
-            print(f"[BACKGROUND] Erro na transcrição: {final.get('error')}")
+            _mark_job_failed(job_id, f"Erro na transcrição: {final.get('error')}", supabase_url, service_key)
             return
         
         # Salvar no Supabase
@@ -421,7 +630,7 @@ def _process_upload_transcription(
         process_and_save_transcription(
             text, 
             job_id, 
-            "UPLOAD", 
+            video_url, 
             filename, 
             user_id, 
             url_hash=url_hash, 
@@ -436,6 +645,7 @@ def _process_upload_transcription(
         print(f"[BACKGROUND] Erro no processamento: {e}")
         import traceback
         traceback.print_exc()
+        _mark_job_failed(job_id, f"Erro no processamento: {e}", supabase_url, service_key)
 
 
 @app.post("/api/transcribe/upload")
@@ -479,7 +689,7 @@ async def transcribe_upload(
 
         # Idempotência baseada no conteúdo do arquivo
         file_hash = download._calculate_file_hash(audio_path)
-        url_hash = f"upload:{file_hash}"
+        url_hash = f"upload:{FILE_HASH_ALGO}:{file_hash}"
 
         lock = _get_lock_for(url_hash)
         with lock:
@@ -509,6 +719,7 @@ async def transcribe_upload(
                     "video_url": "UPLOAD",
                     "reuniao": file.filename,
                     "status": "processing",
+                    "created_at": datetime.now(timezone.utc).isoformat(),
                     "url_hash": url_hash,
                 }
                 if user_id:
@@ -1,5 +1,5 @@
 from functools import wraps
-from fastapi import HTTPException, Depends, Header
+from fastapi import HTTPException, Depends, Header, Request
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from typing import Optional
 import jwt
@@ -17,6 +17,17 @@ SUPABASE_JWT_SECRET = os.getenv('SUPABASE_JWT_SECRET')
 
 SERVICE_API_KEY = os.getenv('TRANSCRIPTION_SERVICE_API_KEY')
 
+# Configuração do Registry (lida uma vez no import; use reload_config() após alterar o ambiente)
+_REGISTRY_URL = os.getenv("REGISTRY_API_URL", "http://localhost:3000")
+_REGISTRY_SERVICE_TOKEN = os.getenv("REGISTRY_SERVICE_TOKEN")
+
+
+def reload_config():
+    """Relê as variáveis de ambiente do Registry usadas na busca do JWT secret."""
+    global _REGISTRY_URL, _REGISTRY_SERVICE_TOKEN
+    _REGISTRY_URL = os.getenv("REGISTRY_API_URL", "http://localhost:3000")
+    _REGISTRY_SERVICE_TOKEN = os.getenv("REGISTRY_SERVICE_TOKEN")
+
 # Cache para JWT secrets por tenant
 _jwt_secret_cache = {}
 
@@ -40,17 +51,18 @@ async def get_tenant_jwt_secret() -> str:
         
         if tenant_ctx.tenant_slug and tenant_ctx.tenant_data:
             # Verificar cache primeiro
-            if tenant_ctx.tenant_slug in _jwt_secret_cache:
+            cached_secret = _jwt_secret_cache.get(tenant_ctx.tenant_slug)
+            if cached_secret is not None:
                 logger.debug(f"[Auth] JWT secret do tenant '{tenant_ctx.tenant_slug}' encontrado no cache")
-                return _jwt_secret_cache[tenant_ctx.tenant_slug]
+                return cached_secret
             
             # Buscar JWT secret do Registry para este tenant
-            registry_url = os.getenv("REGISTRY_API_URL", "http://localhost:3000")
+            registry_url = _REGISTRY_URL
             if registry_url:
                 try:
                     async with httpx.AsyncClient(timeout=10.0) as client:
                         url = f"{registry_url}/api/tenants/by-slug/{tenant_ctx.tenant_slug}/backend-credentials"
-                        service_token = os.getenv("REGISTRY_SERVICE_TOKEN")
+                        service_token = _REGISTRY_SERVICE_TOKEN
                         
                         if not service_token:
                             logger.warning("[Auth] REGISTRY_SERVICE_TOKEN não configurado, usando JWT secret padrão")
@@ -114,16 +126,25 @@ class AuthMiddleware:
         }
 
 # Dependência para rotas que requerem autenticação
-async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
-    """Dependência para obter o usuário atual autenticado"""
+async def get_current_user(request: Request, credentials: HTTPAuthorizationCredentials = Depends(security)):
+    """Dependência para obter o usuário atual autenticado
+    
+    O resultado fica memoizado em `request.state` (por token), então outras
+    dependências da mesma requisição reaproveitam a verificação do JWT.
+    """
     if not credentials:
         raise HTTPException(status_code=401, detail="Token de autenticação necessário")
     
     token = credentials.credentials
+    cached = getattr(request.state, "_auth_user", None)
+    if cached is not None and cached[0] == token:
+        return dict(cached[1])
+    
     payload = await AuthMiddleware.verify_token(token)
     user = AuthMiddleware.get_user_from_token(payload)
+    request.state._auth_user = (token, user)
     
-    return user
+    return dict(user)
 
 # Dependência opcional (usuário pode ou não estar autenticado)
 async def get_current_user_optional(credentials: HTTPAuthorizationCredentials = Depends(HTTPBearer(auto_error=False))):
@@ -149,6 +170,7 @@ async def get_current_user_optional(credentials: HTTPAuthorizationCredentials =
         return None
 
 async def get_current_user_or_service(
+    request: Request,
     credentials: HTTPAuthorizationCredentials = Depends(security),
     x_api_key: Optional[str] = Header(None, alias="X-Api-Key")
 ):
@@ -171,9 +193,7 @@ async def get_current_user_or_service(
     if not credentials:
         raise HTTPException(status_code=401, detail="Autenticação necessária (JWT ou API Key)")
     
-    token = credentials.credentials
-    payload = await AuthMiddleware.verify_token(token)
-    user = AuthMiddleware.get_user_from_token(payload)
+    user = await get_current_user(request, credentials)
     user["is_service"] = False
     
     return user
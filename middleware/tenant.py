@@ -3,8 +3,9 @@ Middleware para detectar e validar tenant em cada requisição.
 VERSÃO ATUALIZADA COM SUPORTE A serviceRole via endpoint /backend-credentials
 """
 from fastapi import Request, HTTPException
-from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.types import ASGIApp, Receive, Scope, Send
 from typing import Optional
+from urllib.parse import urlparse, parse_qsl
 import logging
 import httpx
 import os
@@ -15,6 +16,19 @@ logger = logging.getLogger(__name__)
 # Cache em memória (em produção, usar Redis)
 _tenant_cache = {}
 
+# Configurações lidas uma única vez no import (use reload_config() após alterar o ambiente)
+_DEFAULT_TENANT_SLUG = os.getenv("DEFAULT_TENANT_SLUG", "dev")
+_REGISTRY_URL = os.getenv("REGISTRY_API_URL", "http://localhost:3000")
+_REGISTRY_SERVICE_TOKEN = os.getenv("REGISTRY_SERVICE_TOKEN")
+
+
+def reload_config():
+    """Relê as variáveis de ambiente do Registry e do tenant padrão."""
+    global _DEFAULT_TENANT_SLUG, _REGISTRY_URL, _REGISTRY_SERVICE_TOKEN
+    _DEFAULT_TENANT_SLUG = os.getenv("DEFAULT_TENANT_SLUG", "dev")
+    _REGISTRY_URL = os.getenv("REGISTRY_API_URL", "http://localhost:3000")
+    _REGISTRY_SERVICE_TOKEN = os.getenv("REGISTRY_SERVICE_TOKEN")
+
 
 class TenantContext:
     """Contexto do tenant para a requisição atual."""
@@ -73,8 +87,8 @@ async def get_tenant_from_registry(slug: str, include_backend_credentials: bool
     cache_key = f"{slug}:backend" if include_backend_credentials else slug
     
     # Verificar cache
-    if cache_key in _tenant_cache:
-        cached_data = _tenant_cache[cache_key]
+    cached_data = _tenant_cache.get(cache_key)
+    if cached_data is not None:
         cached_url = cached_data.get("supabaseUrl", "N/A") if cached_data else "N/A"
         has_service_role = bool(cached_data.get("serviceRole")) if cached_data else False
         logger.info(f"[Registry] CACHE HIT para '{slug}' | Supabase: {cached_url[:50]}... | cache_key={cache_key} | has_serviceRole={has_service_role}")
@@ -83,12 +97,12 @@ async def get_tenant_from_registry(slug: str, include_backend_credentials: bool
         if include_backend_credentials and not has_service_role:
             logger.warning(f"[Registry] Cache para '{slug}' não tem serviceRole, forçando nova busca no Registry")
             # Limpar cache e buscar novamente
-            del _tenant_cache[cache_key]
+            _tenant_cache.pop(cache_key, None)
         else:
             return cached_data
     
     # Configurações do Registry
-    registry_url = os.getenv("REGISTRY_API_URL", "http://localhost:3000")
+    registry_url = _REGISTRY_URL
     
     # Validar que a URL tem protocolo
     if registry_url and not registry_url.startswith(("http://", "https://")):
@@ -104,7 +118,7 @@ async def get_tenant_from_registry(slug: str, include_backend_credentials: bool
                 url = f"{registry_url}/api/tenants/by-slug/{slug}/backend-credentials"
                 
                 # Token de service-to-service authentication
-                service_token = os.getenv("REGISTRY_SERVICE_TOKEN")
+                service_token = _REGISTRY_SERVICE_TOKEN
                 if not service_token:
                     logger.error("REGISTRY_SERVICE_TOKEN não configurado - não é possível obter credenciais de backend")
                     return None
@@ -154,31 +168,122 @@ async def get_tenant_from_registry(slug: str, include_backend_credentials: bool
         return None
 
 
-def clear_tenant_cache(slug: Optional[str] = None):
-    """Limpa o cache de tenants."""
-    global _tenant_cache
+def clear_tenant_cache(slug: Optional[str] = None) -> int:
+    """Limpa o cache de tenants (entradas públicas e de backend). Retorna o número de entradas removidas."""
     if slug:
-        _tenant_cache.pop(slug, None)
+        removed = sum(1 for key in (slug, f"{slug}:backend") if _tenant_cache.pop(key, None) is not None)
         logger.info(f"Cache do tenant '{slug}' limpo")
     else:
+        removed = len(_tenant_cache)
         _tenant_cache.clear()
         logger.info("Cache de todos os tenants limpo")
+    return removed
+
+
+def _slug_from_url(value: Optional[str], source: str) -> Optional[str]:
+    """Extrai o tenant do subdomínio de uma URL (Origin ou Referer)."""
+    if not value:
+        return None
+    try:
+        parsed = urlparse(value)
+        host = parsed.netloc or parsed.hostname or ""
+        if "." in host and not host.startswith("localhost"):
+            tenant_slug = host.split(".")[0]
+            logger.debug(f"Tenant detectado via {source}: {tenant_slug}")
+            return tenant_slug
+    except Exception as e:
+        logger.debug(f"Erro ao extrair tenant do {source}: {e}")
+    return None
+
+
+async def _load_tenant_context(context: TenantContext, tenant_slug: str, path: str):
+    """Busca o tenant no Registry e configura o contexto da requisição."""
+    # Determinar se precisa de credenciais de backend (serviceRole)
+    # Endpoints que fazem INSERT/UPDATE no Supabase precisam de serviceRole
+    needs_backend_creds = any([
+        "/upload" in path,
+        "/transcribe" in path,
+        "/process" in path,
+    ])
+    
+    logger.info(f"[TenantMiddleware] Path: {path} | needs_backend_creds: {needs_backend_creds}")
+    
+    # Buscar dados do tenant no Registry
+    try:
+        tenant_data = await get_tenant_from_registry(
+            tenant_slug, 
+            include_backend_credentials=needs_backend_creds
+        )
+        
+        if not tenant_data:
+            # Se não encontrou no Registry, deixar passar para usar .env (fallback)
+            logger.warning(f"[TenantMiddleware] Tenant '{tenant_slug}' não encontrado, usando credenciais padrão")
+            context.set_tenant(tenant_slug, {})
+        else:
+            # Configurar contexto do tenant
+            context.set_tenant(tenant_slug, tenant_data)
+            # Log detalhado para debug
+            supabase_url = tenant_data.get("supabaseUrl", "N/A")
+            has_service_role = bool(tenant_data.get("serviceRole"))
+            logger.info(f"[TenantMiddleware] Tenant configurado: {tenant_slug} | Supabase: {supabase_url[:50]}... | serviceRole: {has_service_role}")
+        
+    except Exception as e:
+        logger.error(f"Erro ao buscar tenant '{tenant_slug}': {e}")
+        # Continuar com credenciais padrão
+        context.set_tenant(tenant_slug, {})
+
+
+def _resolve_tenant_slug(
+    tenant_header: Optional[str],
+    origin: Optional[str],
+    referer: Optional[str],
+    query_tenant: Optional[str],
+) -> str:
+    """Resolve o slug do tenant na ordem de prioridade do middleware."""
+    # 1. Tentar via header (prioritário)
+    tenant_slug = tenant_header
+    
+    # 2. Tentar via subdomain do FRONTEND (Origin ou Referer)
+    if not tenant_slug:
+        tenant_slug = _slug_from_url(origin, "Origin") or _slug_from_url(referer, "Referer")
+    
+    # 3. Tentar via query param
+    if not tenant_slug:
+        tenant_slug = query_tenant
+    
+    # Se não encontrou tenant, usar tenant padrão (para compatibilidade)
+    if not tenant_slug:
+        tenant_slug = _DEFAULT_TENANT_SLUG
+        logger.debug(f"Nenhum tenant especificado, usando '{tenant_slug}'")
+    
+    return tenant_slug
 
 
-class TenantMiddleware(BaseHTTPMiddleware):
+class TenantMiddleware:
     """
-    Middleware que detecta o tenant via:
+    Middleware ASGI puro que detecta o tenant via:
     1. Header X-Tenant-Slug
     2. Subdomain (ex: acme.localhost)
     3. Query param ?tenant=slug
+    
+    Não usa BaseHTTPMiddleware: os headers são lidos direto do `scope`,
+    sem construir `Request` nem passar a resposta por um stream extra.
     """
     
-    async def dispatch(self, request: Request, call_next):
+    def __init__(self, app: ASGIApp):
+        self.app = app
+    
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        # Apenas requisições HTTP passam pela detecção de tenant (lifespan/websocket seguem direto)
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
         # Ignorar requisições OPTIONS (CORS preflight) - elas não têm headers customizados
-        if request.method == "OPTIONS":
-            logger.debug(f"[TenantMiddleware] Ignorando OPTIONS para {request.url.path}")
-            response = await call_next(request)
-            return response
+        if scope["method"] == "OPTIONS":
+            logger.debug(f"[TenantMiddleware] Ignorando OPTIONS para {scope['path']}")
+            await self.app(scope, receive, send)
+            return
         
         # CRÍTICO: Criar um novo contexto para esta requisição
         # Isso garante isolamento completo entre requisições concorrentes
@@ -186,86 +291,29 @@ class TenantMiddleware(BaseHTTPMiddleware):
         token = _tenant_context_var.set(new_context)
         
         try:
-            tenant_slug = None
-            
-            # 1. Tentar via header (prioritário)
-            tenant_slug = request.headers.get("X-Tenant-Slug")
+            # Uma única passada sobre `scope["headers"]` (nomes já em minúsculas);
+            # só os valores dos headers relevantes são decodificados
+            tenant_header = origin = referer = None
+            for key, value in scope["headers"]:
+                if key == b"x-tenant-slug":
+                    tenant_header = value.decode("latin-1")
+                elif key == b"origin":
+                    origin = value.decode("latin-1")
+                elif key == b"referer":
+                    referer = value.decode("latin-1")
             
-            # 2. Tentar via subdomain do FRONTEND (Origin ou Referer)
-            if not tenant_slug:
-                # Tentar extrair do Origin (CORS requests)
-                origin = request.headers.get("origin", "")
-                if origin:
-                    try:
-                        from urllib.parse import urlparse
-                        parsed = urlparse(origin)
-                        host = parsed.netloc or parsed.hostname or ""
-                        if "." in host and not host.startswith("localhost"):
-                            tenant_slug = host.split(".")[0]
-                            logger.debug(f"Tenant detectado via Origin: {tenant_slug}")
-                    except Exception as e:
-                        logger.debug(f"Erro ao extrair tenant do Origin: {e}")
-                
-                # Fallback: tentar Referer
-                if not tenant_slug:
-                    referer = request.headers.get("referer", "")
-                    if referer:
-                        try:
-                            from urllib.parse import urlparse
-                            parsed = urlparse(referer)
-                            host = parsed.netloc or parsed.hostname or ""
-                            if "." in host and not host.startswith("localhost"):
-                                tenant_slug = host.split(".")[0]
-                                logger.debug(f"Tenant detectado via Referer: {tenant_slug}")
-                        except Exception as e:
-                            logger.debug(f"Erro ao extrair tenant do Referer: {e}")
-            
-            # 3. Tentar via query param
-            if not tenant_slug:
-                tenant_slug = request.query_params.get("tenant")
-            
-            # Se não encontrou tenant, usar tenant padrão (para compatibilidade)
-            if not tenant_slug:
-                tenant_slug = os.getenv("DEFAULT_TENANT_SLUG", "dev")
-                logger.debug(f"Nenhum tenant especificado, usando '{tenant_slug}'")
+            query_string = scope.get("query_string", b"").decode("latin-1")
+            tenant_slug = _resolve_tenant_slug(
+                tenant_header,
+                origin,
+                referer,
+                dict(parse_qsl(query_string)).get("tenant") if query_string else None,
+            )
             
-            # Determinar se precisa de credenciais de backend (serviceRole)
-            # Endpoints que fazem INSERT/UPDATE no Supabase precisam de serviceRole
-            needs_backend_creds = any([
-                "/upload" in request.url.path,
-                "/transcribe" in request.url.path,
-                "/process" in request.url.path,
-            ])
-            
-            logger.info(f"[TenantMiddleware] Path: {request.url.path} | needs_backend_creds: {needs_backend_creds}")
-            
-            # Buscar dados do tenant no Registry
-            try:
-                tenant_data = await get_tenant_from_registry(
-                    tenant_slug, 
-                    include_backend_credentials=needs_backend_creds
-                )
-                
-                if not tenant_data:
-                    # Se não encontrou no Registry, deixar passar para usar .env (fallback)
-                    logger.warning(f"[TenantMiddleware] Tenant '{tenant_slug}' não encontrado, usando credenciais padrão")
-                    new_context.set_tenant(tenant_slug, {})
-                else:
-                    # Configurar contexto do tenant
-                    new_context.set_tenant(tenant_slug, tenant_data)
-                    # Log detalhado para debug
-                    supabase_url = tenant_data.get("supabaseUrl", "N/A")
-                    has_service_role = bool(tenant_data.get("serviceRole"))
-                    logger.info(f"[TenantMiddleware] Tenant configurado: {tenant_slug} | Supabase: {supabase_url[:50]}... | serviceRole: {has_service_role}")
-                
-            except Exception as e:
-                logger.error(f"Erro ao buscar tenant '{tenant_slug}': {e}")
-                # Continuar com credenciais padrão
-                new_context.set_tenant(tenant_slug, {})
+            await _load_tenant_context(new_context, tenant_slug, scope["path"])
             
             # Processar requisição
-            response = await call_next(request)
-            return response
+            await self.app(scope, receive, send)
         finally:
             # CRÍTICO: Resetar o contexto após processar a requisição
             # Isso garante que o contexto não vaze para outras requisições
@@ -275,5 +323,19 @@ class TenantMiddleware(BaseHTTPMiddleware):
 # Manter função legada para compatibilidade
 async def tenant_middleware(request: Request, call_next):
     """Função wrapper para compatibilidade com código legado."""
-    middleware = TenantMiddleware(app=None)
-    return await middleware.dispatch(request, call_next)
+    if request.method == "OPTIONS":
+        return await call_next(request)
+    
+    new_context = TenantContext()
+    token = _tenant_context_var.set(new_context)
+    try:
+        tenant_slug = _resolve_tenant_slug(
+            request.headers.get("X-Tenant-Slug"),
+            request.headers.get("origin"),
+            request.headers.get("referer"),
+            request.query_params.get("tenant"),
+        )
+        await _load_tenant_context(new_context, tenant_slug, request.url.path)
+        return await call_next(request)
+    finally:
+        _tenant_context_var.reset(token)
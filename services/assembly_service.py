@@ -1,15 +1,140 @@
 import requests
+from requests.adapters import HTTPAdapter
+import urllib3
+from urllib3.util.retry import Retry
 import time
+import random
 import os
 import logging
 from typing import Dict, Any, Optional, List
 from dataclasses import dataclass
+from collections import OrderedDict
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import json
+import hashlib
+import threading
+import re
+import shutil
+import subprocess
+import tempfile
+
+from services.download_service import find_ffmpeg, find_ffprobe, fadvise
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import blake3
+except ImportError:
+    blake3 = None
 
 # Configuração de logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Verificação de integridade pós-upload (re-download do arquivo): apenas para depuração
+VERIFY_INTEGRITY = os.getenv("ASSEMBLY_VERIFY_INTEGRITY") == "1"
+HASH_CHUNK_SIZE = 1 << 20  # 1 MiB
+# Tamanho do bloco de envio do corpo HTTP (http.client usa 8 KiB por padrão, o que limita uploads grandes)
+UPLOAD_BLOCKSIZE = 64 * 1024
+
+# Timeouts (connect, read): conexão falha rápido, leitura generosa (uploads grandes demoram a responder)
+CONNECT_TIMEOUT = 10
+UPLOAD_READ_TIMEOUT = 1800
+API_READ_TIMEOUT = 60
+
+# Segredo enviado pela AssemblyAI no header do webhook; callbacks sem ele são rejeitados
+WEBHOOK_AUTH_HEADER_NAME = "X-Webhook-Secret"
+WEBHOOK_SECRET = os.getenv("ASSEMBLYAI_WEBHOOK_SECRET")
+# URL pública do webhook de conclusão (ex: https://<host>/api/webhooks/assemblyai); sem ela (ou sem o segredo), usa polling
+WEBHOOK_URL = os.getenv("ASSEMBLYAI_WEBHOOK_URL") if WEBHOOK_SECRET else None
+if os.getenv("ASSEMBLYAI_WEBHOOK_URL") and not WEBHOOK_SECRET:
+    logging.getLogger(__name__).warning("ASSEMBLYAI_WEBHOOK_URL ignorado: defina ASSEMBLYAI_WEBHOOK_SECRET para autenticar o webhook")
+# Mesmo com webhook, o status é conferido periodicamente caso o callback se perca (ex: caiu em outra réplica)
+WEBHOOK_FALLBACK_POLL_SECONDS = 300
+
+# Polling com backoff exponencial + jitter: intervalo = min(teto, base * 2^tentativa)
+POLL_BASE_INTERVAL = 2
+POLL_MAX_INTERVAL = 30
+POLL_MAX_INTERVAL_LONG = 60  # teto após POLL_LONG_AFTER_SECONDS (áudios longos levam minutos)
+POLL_LONG_AFTER_SECONDS = 120
+# Com a duração do áudio conhecida, a 1ª consulta espera ~15% dela (limitada), já que a transcrição não termina antes disso
+POLL_INITIAL_DURATION_FACTOR = 0.15
+POLL_INITIAL_MAX_WAIT = 120
+
+# Jobs simultâneos em process_batch (ajustar ao limite de concorrência da conta AssemblyAI)
+MAX_CONCURRENCY = int(os.getenv("ASSEMBLYAI_MAX_CONCURRENCY", "5"))
+
+# Busca de silêncio ao redor de cada ponto de corte em process_large_file_chunked (segundos)
+SILENCE_SNAP_WINDOW = 30
+
+# Cache LRU curto de transcrições em estado final (completed/error são imutáveis na AssemblyAI): cobre releituras
+# logo após a conclusão (ex: wait_for_completion seguido de get_detailed_transcription). Cada payload completo
+# carrega words/utterances (MBs para uma hora de áudio), então o limite é pequeno e com expiração.
+TERMINAL_CACHE_MAXSIZE = 8
+TERMINAL_CACHE_TTL_SECONDS = 300
+_terminal_cache_lock = threading.Lock()
+_terminal_cache: "OrderedDict[str, tuple]" = OrderedDict()  # transcript_id -> (expira_em, payload)
+
+def _json(response: requests.Response) -> Any:
+    """Decodifica o corpo JSON da resposta (orjson direto dos bytes quando disponível)"""
+    if orjson is not None:
+        try:
+            return orjson.loads(response.content)
+        except ValueError as e:
+            # Mesmo contrato de response.json(): corpo inválido (ex: HTML de um proxy) é uma RequestException
+            raise requests.exceptions.InvalidJSONError(f"Resposta não é um JSON válido: {e}", response=response) from e
+    return response.json()
+
+
+def _new_integrity_hasher():
+    """BLAKE3 (SIMD/multithread, bem mais rápido em arquivos grandes) quando instalado; senão SHA-256"""
+    if blake3 is not None:
+        return blake3.blake3(max_threads=blake3.blake3.AUTO)
+    return hashlib.sha256()
+
+
+def _json_body(data: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(data)
+    return json.dumps(data).encode("utf-8")
+
+
+@lru_cache(maxsize=32)
+def _config_body_skeleton(language_code: str, webhook_url: Optional[str],
+                          word_boost: Optional[tuple], boost_param: str,
+                          webhook_auth_value: Optional[str] = None) -> bytes:
+    """JSON (sem audio_url) de uma configuração de transcrição; configurações repetidas reaproveitam os bytes"""
+    options: Dict[str, Any] = {"language_code": language_code}
+    if webhook_url:
+        options["webhook_url"] = webhook_url
+        if webhook_auth_value:
+            options["webhook_auth_header_name"] = WEBHOOK_AUTH_HEADER_NAME
+            options["webhook_auth_header_value"] = webhook_auth_value
+    if word_boost:
+        options["word_boost"] = list(word_boost)
+        options["boost_param"] = boost_param
+    return _json_body(options)
+
+
+# Transcrições aguardando webhook (compartilhado entre instâncias do serviço no processo)
+_pending_lock = threading.Lock()
+_pending_transcripts: Dict[str, threading.Event] = {}
+
+
+def notify_transcript_ready(transcript_id: str) -> bool:
+    """Acorda quem aguarda a transcrição (chamado pelo webhook). Retorna False se o id não está pendente"""
+    with _pending_lock:
+        event = _pending_transcripts.get(transcript_id)
+    if event is None:
+        return False
+    event.set()
+    return True
+
+
 @dataclass
 class TranscriptionConfig:
     """Configuração para transcrição"""
@@ -22,44 +147,100 @@ class TranscriptionConfig:
     word_boost: Optional[List[str]] = None  # Palavras para boost
     boost_param: str = "default"  # Parâmetro de boost
 
+class _HashingReader:
+    """Wrapper de leitura que atualiza um hash com os bytes enviados no upload"""
+    
+    def __init__(self, f, hasher):
+        self.f = f
+        self.hasher = hasher
+    
+    def read(self, n: int = -1) -> bytes:
+        chunk = self.f.read(n)
+        self.hasher.update(chunk)
+        return chunk
+
+
+class _LargeBlockAdapter(HTTPAdapter):
+    """HTTPAdapter que envia o corpo das requisições em blocos de UPLOAD_BLOCKSIZE"""
+    
+    def init_poolmanager(self, *args, **kwargs):
+        # `blocksize` só é aceito pelo pool do urllib3 2.x; no 1.x mantém o padrão
+        if int(urllib3.__version__.split(".")[0]) >= 2:
+            kwargs["blocksize"] = UPLOAD_BLOCKSIZE
+        super().init_poolmanager(*args, **kwargs)
+
+
+def _resolve_api_key() -> Optional[str]:
+    """Procura a API key da AssemblyAI nas variáveis de ambiente (e no .env como último recurso)"""
+    # Tentar múltiplas formas de obter a API key
+    api_key = None
+    
+    # 1. Tentar variável de ambiente padrão
+    api_key = os.getenv("ASSEMBLYAI_API_KEY")
+    
+    # 2. Tentar variável de ambiente alternativa (Railway às vezes usa nomes diferentes)
+    if not api_key:
+        api_key = os.getenv("ASSEMBLY_AI_API_KEY")
+    
+    # 3. Tentar variável de ambiente do Railway
+    if not api_key:
+        api_key = os.getenv("RAILWAY_ASSEMBLYAI_API_KEY")
+    
+    # 4. Tentar variável de ambiente genérica
+    if not api_key:
+        api_key = os.getenv("API_KEY")
+    
+    # 5. Se ainda não encontrou, tentar carregar de arquivo .env
+    if not api_key:
+        api_key = _load_dotenv_once()
+    
+    return api_key
+
+
+@lru_cache(maxsize=1)
+def _load_dotenv_once() -> Optional[str]:
+    """Carrega o .env uma única vez por processo e retorna a API key encontrada nele"""
+    try:
+        from dotenv import load_dotenv
+        load_dotenv()
+        return os.getenv("ASSEMBLYAI_API_KEY")
+    except ImportError:
+        return None
+
+
+# Resolvida uma vez no import: o serviço é instanciado a cada requisição
+_API_KEY = _resolve_api_key()
+logger.info("AssemblyAI API Key encontrada: %s", 'SIM' if _API_KEY else 'NÃO')
+
+
 class AssemblyAIService:
     """Serviço melhorado para integração com AssemblyAI"""
     
     def __init__(self):
-        # Tentar múltiplas formas de obter a API key
-        self.api_key = None
-        
-        # 1. Tentar variável de ambiente padrão
-        self.api_key = os.getenv("ASSEMBLYAI_API_KEY")
-        
-        # 2. Tentar variável de ambiente alternativa (Railway às vezes usa nomes diferentes)
-        if not self.api_key:
-            self.api_key = os.getenv("ASSEMBLY_AI_API_KEY")
-        
-        # 3. Tentar variável de ambiente do Railway
-        if not self.api_key:
-            self.api_key = os.getenv("RAILWAY_ASSEMBLYAI_API_KEY")
-        
-        # 4. Tentar variável de ambiente genérica
-        if not self.api_key:
-            self.api_key = os.getenv("API_KEY")
-        
-        # 5. Se ainda não encontrou, tentar carregar de arquivo .env
-        if not self.api_key:
-            try:
-                from dotenv import load_dotenv
-                load_dotenv()
-                self.api_key = os.getenv("ASSEMBLYAI_API_KEY")
-            except ImportError:
-                pass
-        
-        logger.info(f"AssemblyAI API Key encontrada: {'SIM' if self.api_key else 'NÃO'}")
+        self.api_key = _API_KEY
         if not self.api_key:
             raise ValueError("ASSEMBLYAI_API_KEY deve estar configurado")
         
         self.headers = {"authorization": self.api_key}
         self.base_url = "https://api.assemblyai.com/v2"
         
+        # Sessão persistente: reaproveita conexões keep-alive (TLS) entre upload, criação e polling
+        self.session = requests.Session()
+        self.session.headers.update(self.headers)
+        # Retentativas por status apenas em GET: repetir um POST reenviaria um corpo de upload já consumido
+        # ou criaria transcrições duplicadas (falhas de conexão continuam sendo retentadas em qualquer método)
+        adapter = _LargeBlockAdapter(
+            pool_connections=4,
+            pool_maxsize=10,
+            max_retries=Retry(
+                total=5,
+                backoff_factor=0.5,
+                status_forcelist=[429, 500, 502, 503, 504],
+                allowed_methods=["GET"],
+            ),
+        )
+        self.session.mount("https://", adapter)
+        
         logger.info("✅ Serviço AssemblyAI inicializado com sucesso")
     
     def upload_file(self, file_path: str) -> Dict[str, Any]:
@@ -69,50 +250,85 @@ class AssemblyAIService:
             file_size = os.path.getsize(file_path)
             if file_size > 5 * 1024 * 1024 * 1024:
                 return {"success": False, "error": "Arquivo muito grande (máximo 5GB)"}
-            logger.info(f"Iniciando upload do arquivo: {file_path} ({file_size} bytes)")
+            logger.info("Iniciando upload do arquivo: %s (%s bytes)", file_path, file_size)
+            original_hash = _new_integrity_hasher() if VERIFY_INTEGRITY else None
             with open(file_path, "rb") as f:
-                response = requests.post(
+                fadvise(f.fileno(), "POSIX_FADV_SEQUENTIAL")
+                # Corpo binário em streaming; o hash (se ativado) é calculado durante o próprio envio
+                response = self.session.post(
                     f"{self.base_url}/upload",
-                    headers=self.headers,
-                    files={"file": f},
-                    timeout=300
+                    headers={"Content-Length": str(file_size)},
+                    data=_HashingReader(f, original_hash) if original_hash else f,
+                    timeout=(CONNECT_TIMEOUT, UPLOAD_READ_TIMEOUT)
                 )
+                # O upload é o último leitor do arquivo: liberar o page cache para os demais workers
+                fadvise(f.fileno(), "POSIX_FADV_DONTNEED")
             response.raise_for_status()
-            upload_url = response.json()["upload_url"]
-            logger.info(f"Upload concluído: {upload_url}")
+            upload_url = _json(response)["upload_url"]
+            logger.info("Upload concluído: %s", upload_url)
+            if original_hash:
+                integrity = self._verify_upload_integrity(upload_url, original_hash.hexdigest())
+                if not integrity["success"]:
+                    return integrity
             return {"success": True, "upload_url": upload_url}
         except requests.exceptions.RequestException as e:
             return {"success": False, "error": f"Erro na requisição de upload: {str(e)}"}
         except Exception as e:
             return {"success": False, "error": f"Erro inesperado durante upload: {str(e)}"}
     
+    def _verify_upload_integrity(self, upload_url: str, original_hash: str) -> Dict[str, Any]:
+        """Baixa o arquivo enviado em streaming e compara o hash com o original (opt-in via ASSEMBLY_VERIFY_INTEGRITY=1)"""
+        downloaded_hash = _new_integrity_hasher()
+        with self.session.get(upload_url, stream=True, timeout=(CONNECT_TIMEOUT, API_READ_TIMEOUT)) as r:
+            r.raise_for_status()
+            for chunk in r.iter_content(HASH_CHUNK_SIZE):
+                downloaded_hash.update(chunk)
+        if original_hash != downloaded_hash.hexdigest():
+            logger.error("Hash divergente após upload: %s != %s", original_hash, downloaded_hash.hexdigest())
+            return {"success": False, "error": "Falha na verificação de integridade do upload"}
+        logger.info("Integridade do upload verificada: %s", original_hash)
+        return {"success": True}
+    
     def start_transcription(self, audio_url: str, 
                           config: Optional[TranscriptionConfig] = None) -> Dict[str, Any]:
         try:
             if not config:
                 config = TranscriptionConfig()
-            json_data = {
-                "audio_url": audio_url,
-                "language_code": config.language_code
-            }
-            if config.webhook_url:
-                json_data["webhook_url"] = config.webhook_url
-            if config.word_boost:
-                json_data["word_boost"] = config.word_boost
-                json_data["boost_param"] = config.boost_param
-            logger.info(f"Iniciando transcrição com configurações: {json_data}")
-            response = requests.post(
+            webhook_url = config.webhook_url or WEBHOOK_URL
+            own_webhook = bool(WEBHOOK_URL) and webhook_url == WEBHOOK_URL
+            skeleton = _config_body_skeleton(
+                config.language_code,
+                webhook_url,
+                tuple(config.word_boost) if config.word_boost else None,
+                config.boost_param,
+                # O segredo só vai para o nosso próprio endpoint, nunca para um webhook_url de terceiros
+                WEBHOOK_SECRET if own_webhook else None,
+            )
+            # Só o audio_url muda entre chamadas: é inserido no JSON já serializado da configuração
+            body = b'{"audio_url":' + _json_body(audio_url) + b"," + skeleton[1:]
+            logger.info("Iniciando transcrição: %s", audio_url)
+            if logger.isEnabledFor(logging.DEBUG):
+                # O corpo pode conter o segredo do webhook: registrar uma cópia sem ele
+                logged = json.loads(body)
+                if "webhook_auth_header_value" in logged:
+                    logged["webhook_auth_header_value"] = "***"
+                logger.debug("Payload enviado: %s", logged)
+            response = self.session.post(
                 f"{self.base_url}/transcript",
-                json=json_data,
-                headers=self.headers,
-                timeout=30
+                data=body,
+                headers={"Content-Type": "application/json"},
+                timeout=(CONNECT_TIMEOUT, API_READ_TIMEOUT)
             )
             try:
                 response.raise_for_status()
             except requests.exceptions.HTTPError as http_err:
-                logger.error(f"Erro ao iniciar transcrição: {http_err}. Resposta: {response.text}")
+                logger.error("Erro ao iniciar transcrição: %s. Resposta: %s", http_err, response.text)
                 return {"success": False, "error": f"Erro ao iniciar transcrição: {http_err}. Resposta AssemblyAI: {response.text}"}
-            result = response.json()
+            result = _json(response)
+            if own_webhook:
+                # Registrar antes de retornar para não perder um webhook que chegue antes do wait_for_completion
+                with _pending_lock:
+                    _pending_transcripts.setdefault(result["id"], threading.Event())
             return {"success": True, "transcript_id": result["id"]}
         except requests.exceptions.RequestException as e:
             return {"success": False, "error": f"Erro ao iniciar transcrição: {str(e)}"}
@@ -120,36 +336,250 @@ class AssemblyAIService:
             return {"success": False, "error": f"Erro inesperado ao iniciar transcrição: {str(e)}"}
     
     def get_transcription_status(self, transcript_id: str) -> Dict[str, Any]:
+        with _terminal_cache_lock:
+            entry = _terminal_cache.get(transcript_id)
+            if entry is not None:
+                expires_at, cached = entry
+                if expires_at > time.monotonic():
+                    _terminal_cache.move_to_end(transcript_id)
+                    return {"success": True, "status": cached["status"], "data": cached}
+                del _terminal_cache[transcript_id]
         try:
-            response = requests.get(
+            response = self.session.get(
                 f"{self.base_url}/transcript/{transcript_id}",
-                headers=self.headers,
-                timeout=30
+                timeout=(CONNECT_TIMEOUT, API_READ_TIMEOUT)
             )
             response.raise_for_status()
-            result = response.json()
+            result = _json(response)
+            if result["status"] in ("completed", "error"):
+                with _terminal_cache_lock:
+                    _terminal_cache[transcript_id] = (time.monotonic() + TERMINAL_CACHE_TTL_SECONDS, result)
+                    _terminal_cache.move_to_end(transcript_id)
+                    if len(_terminal_cache) > TERMINAL_CACHE_MAXSIZE:
+                        _terminal_cache.popitem(last=False)
             return {"success": True, "status": result["status"], "data": result}
         except requests.exceptions.RequestException as e:
             return {"success": False, "error": f"Erro ao verificar status: {str(e)}"}
     
-    def wait_for_completion(self, transcript_id: str, max_wait_time: int = 3600) -> Dict[str, Any]:
+    def get_detailed_transcription(self, transcript_id: str) -> Dict[str, Any]:
+        """Retorna texto, palavras, utterances e a lista de speakers (na ordem em que aparecem)"""
+        status_result = self.get_transcription_status(transcript_id)
+        if not status_result["success"]:
+            return status_result
+        if status_result["status"] != "completed":
+            return {"success": False, "status": status_result["status"], "error": "Transcrição ainda não concluída"}
+        data = status_result["data"]
+        utterances = data.get("utterances") or []
+        detailed_result = {
+            "success": True,
+            "transcript_id": transcript_id,
+            "text": data.get("text", ""),
+            "words": data.get("words") or [],
+            "utterances": utterances,
+            "confidence": data.get("confidence"),
+            "audio_duration": data.get("audio_duration"),
+        }
+        if data.get("speaker_labels"):
+            detailed_result["speakers"] = list(dict.fromkeys(u["speaker"] for u in utterances if "speaker" in u))
+        return detailed_result
+    
+    def _check_terminal(self, transcript_id: str) -> Optional[Dict[str, Any]]:
+        """Consulta o status e retorna o resultado final, ou None se a transcrição ainda está em andamento"""
+        status_result = self.get_transcription_status(transcript_id)
+        if not status_result["success"]:
+            return status_result
+        status = status_result["status"]
+        if status == "completed":
+            logger.info("Transcrição concluída: %s", transcript_id)
+            return {"success": True, "status": "completed", "data": status_result["data"]}
+        elif status == "error":
+            error_msg = status_result["data"].get("error", "Erro desconhecido na transcrição")
+            return {"success": False, "status": "error", "error": error_msg}
+        return None
+    
+    def _wait_for_webhook(self, transcript_id: str, event: threading.Event, max_wait_time: int) -> Dict[str, Any]:
+        start_time = time.time()
+        logger.info("Aguardando webhook da transcrição: %s", transcript_id)
+        while True:
+            remaining = max_wait_time - (time.time() - start_time)
+            if remaining <= 0:
+                break
+            event.wait(timeout=min(remaining, WEBHOOK_FALLBACK_POLL_SECONDS))
+            event.clear()
+            # O webhook apenas acorda a espera; o status real sempre vem da API
+            result = self._check_terminal(transcript_id)
+            if result is not None:
+                return result
+        return {"success": False, "error": f"Timeout aguardando transcrição {transcript_id} após {max_wait_time} segundos"}
+    
+    def wait_for_completion(self, transcript_id: str, max_wait_time: int = 3600,
+                            hint_seconds: Optional[float] = None) -> Dict[str, Any]:
+        with _pending_lock:
+            event = _pending_transcripts.get(transcript_id)
+        if event is not None:
+            try:
+                return self._wait_for_webhook(transcript_id, event, max_wait_time)
+            finally:
+                with _pending_lock:
+                    _pending_transcripts.pop(transcript_id, None)
+        
+        # Fallback: polling quando não há webhook configurado
         start_time = time.time()
-        polling_interval = 5
-        max_interval = 30
-        logger.info(f"Aguardando conclusão da transcrição: {transcript_id}")
+        attempt = 0
+        logger.info("Aguardando conclusão da transcrição: %s", transcript_id)
+        if hint_seconds:
+            time.sleep(min(max(5, hint_seconds * POLL_INITIAL_DURATION_FACTOR), POLL_INITIAL_MAX_WAIT, max_wait_time))
         while time.time() - start_time < max_wait_time:
-            status_result = self.get_transcription_status(transcript_id)
-            if not status_result["success"]:
-                return status_result
-            status = status_result["status"]
-            if status == "completed":
-                logger.info(f"Transcrição concluída: {transcript_id}")
-                return {"success": True, "status": "completed", "data": status_result["data"]}
-            elif status == "error":
-                error_msg = status_result["data"].get("error", "Erro desconhecido na transcrição")
-                return {"success": False, "status": "error", "error": error_msg}
-            time.sleep(polling_interval)
-            polling_interval = min(polling_interval + 2, max_interval)
+            result = self._check_terminal(transcript_id)
+            if result is not None:
+                return result
+            attempt = min(attempt + 1, 10)
+            elapsed = time.time() - start_time
+            max_interval = POLL_MAX_INTERVAL_LONG if elapsed > POLL_LONG_AFTER_SECONDS else POLL_MAX_INTERVAL
+            polling_interval = min(max_interval, POLL_BASE_INTERVAL * (2 ** attempt))
+            # Jitter evita que jobs paralelos consultem a API em sincronia
+            time.sleep(random.uniform(polling_interval / 2, polling_interval))
         return {"success": False, "error": f"Timeout aguardando transcrição {transcript_id} após {max_wait_time} segundos"}
-
-
+    
+    def process_complete_transcription(self, file_path: str,
+                                       config: Optional[TranscriptionConfig] = None) -> Dict[str, Any]:
+        """Executa upload, criação e espera da transcrição de um arquivo local"""
+        upload = self.upload_file(file_path)
+        if not upload.get("success"):
+            return upload
+        trans = self.start_transcription(upload["upload_url"], config=config)
+        if not trans.get("success"):
+            return trans
+        final = self.wait_for_completion(trans["transcript_id"], hint_seconds=self.estimate_duration(file_path))
+        final["transcript_id"] = trans["transcript_id"]
+        return final
+    
+    def estimate_duration(self, file_path: str) -> Optional[float]:
+        """Duração do áudio em segundos via ffprobe (None se não for possível obter)"""
+        try:
+            return self._probe_duration(file_path)
+        except Exception as e:
+            logger.debug("Não foi possível obter a duração de %s: %s", file_path, e)
+            return None
+    
+    def process_batch(self, file_paths: List[str], max_concurrency: Optional[int] = None,
+                      config: Optional[TranscriptionConfig] = None) -> Dict[str, Dict[str, Any]]:
+        """Transcreve vários arquivos em paralelo (I/O-bound), retornando {file_path: resultado}"""
+        max_workers = max(1, min(max_concurrency or MAX_CONCURRENCY, len(file_paths) or 1))
+        results: Dict[str, Dict[str, Any]] = {}
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {
+                executor.submit(self.process_complete_transcription, path, config): path
+                for path in file_paths
+            }
+            for future in as_completed(futures):
+                path = futures[future]
+                try:
+                    results[path] = future.result()
+                except Exception as e:
+                    results[path] = {"success": False, "error": f"Erro inesperado ao processar {path}: {str(e)}"}
+        return results
+    
+    @staticmethod
+    def _probe_duration(path: str) -> float:
+        cmd = [find_ffprobe() or 'ffprobe', '-v', 'error', '-show_entries', 'format=duration', '-of', 'json', path]
+        result = subprocess.run(cmd, capture_output=True, text=True, check=True, timeout=60)
+        return float(json.loads(result.stdout)['format']['duration'])
+    
+    @staticmethod
+    def _detect_silences(path: str) -> List[float]:
+        """Retorna o ponto médio de cada silêncio detectado pelo filtro silencedetect do ffmpeg"""
+        cmd = [find_ffmpeg() or 'ffmpeg', '-hide_banner', '-nostats', '-i', path, '-af', 'silencedetect=noise=-30dB:d=0.5', '-f', 'null', '-']
+        result = subprocess.run(cmd, capture_output=True, text=True, timeout=1800)
+        midpoints = []
+        for match in re.finditer(r"silence_end: ([\d.]+) \| silence_duration: ([\d.]+)", result.stderr):
+            end, duration = float(match.group(1)), float(match.group(2))
+            midpoints.append(end - duration / 2)
+        return midpoints
+    
+    def _split_points(self, path: str, duration: float, chunk_seconds: int) -> List[float]:
+        """Pontos de corte a cada chunk_seconds, ajustados para o silêncio mais próximo (evita cortar palavras)"""
+        try:
+            silences = self._detect_silences(path)
+        except Exception as e:
+            logger.warning("silencedetect falhou, usando cortes fixos: %s", e)
+            silences = []
+        points = []
+        target = chunk_seconds
+        while target < duration:
+            nearby = [t for t in silences if abs(t - target) <= SILENCE_SNAP_WINDOW and (not points or t > points[-1])]
+            points.append(min(nearby, key=lambda t: abs(t - target)) if nearby else target)
+            target += chunk_seconds
+        return points
+    
+    def process_large_file_chunked(self, file_path: str, chunk_seconds: int = 300, concurrency: int = 6,
+                                   config: Optional[TranscriptionConfig] = None) -> Dict[str, Any]:
+        """Divide o áudio em partes (~chunk_seconds, cortadas em silêncios), transcreve em paralelo e junta o resultado
+        
+        Os timestamps de `words`/`utterances` são deslocados pelo início real de cada parte.
+        Os rótulos de speaker são atribuídos por parte e podem não coincidir entre partes.
+        """
+        try:
+            duration = self._probe_duration(file_path)
+        except Exception as e:
+            return {"success": False, "error": f"Erro ao obter duração do áudio: {str(e)}"}
+        if duration <= chunk_seconds:
+            return self.process_complete_transcription(file_path, config)
+        
+        parts_dir = tempfile.mkdtemp(prefix="assembly_parts_")
+        try:
+            split_points = self._split_points(file_path, duration, chunk_seconds)
+            extension = os.path.splitext(file_path)[1] or ".mp3"
+            pattern = os.path.join(parts_dir, f"part_%03d{extension}")
+            cmd = [
+                find_ffmpeg() or 'ffmpeg', '-hide_banner', '-y', '-i', file_path,
+                '-f', 'segment', '-segment_times', ",".join(f"{t:.3f}" for t in split_points),
+                '-reset_timestamps', '1', '-c', 'copy', pattern
+            ]
+            logger.info("Dividindo %s em %s partes", file_path, len(split_points) + 1)
+            subprocess.run(cmd, capture_output=True, check=True, timeout=1800)
+            parts = sorted(os.path.join(parts_dir, name) for name in os.listdir(parts_dir))
+            
+            # Com -c copy o corte cai no frame mais próximo; o deslocamento usa a duração real de cada parte
+            offsets_ms = []
+            offset = 0.0
+            for part in parts:
+                offsets_ms.append(int(offset * 1000))
+                offset += self._probe_duration(part)
+            
+            results = self.process_batch(parts, max_concurrency=concurrency, config=config)
+            
+            texts, words, utterances, transcript_ids = [], [], [], []
+            for part, offset_ms in zip(parts, offsets_ms):
+                result = results[part]
+                if not result.get("success"):
+                    return {"success": False, "error": f"Erro na parte {os.path.basename(part)}: {result.get('error')}"}
+                data = result["data"]
+                transcript_ids.append(result.get("transcript_id"))
+                if data.get("text"):
+                    texts.append(data["text"])
+                for word in data.get("words") or []:
+                    words.append({**word, "start": word["start"] + offset_ms, "end": word["end"] + offset_ms})
+                for utterance in data.get("utterances") or []:
+                    shifted = {**utterance, "start": utterance["start"] + offset_ms, "end": utterance["end"] + offset_ms}
+                    if utterance.get("words"):
+                        shifted["words"] = [
+                            {**w, "start": w["start"] + offset_ms, "end": w["end"] + offset_ms}
+                            for w in utterance["words"]
+                        ]
+                    utterances.append(shifted)
+            
+            merged = {
+                "status": "completed",
+                "text": " ".join(texts),
+                "words": words,
+                "utterances": utterances,
+                "audio_duration": duration,
+            }
+            return {"success": True, "status": "completed", "data": merged, "transcript_ids": transcript_ids}
+        except subprocess.CalledProcessError as e:
+            return {"success": False, "error": f"Erro ao dividir áudio com ffmpeg: {e.stderr}"}
+        except Exception as e:
+            return {"success": False, "error": f"Erro inesperado no processamento em partes: {str(e)}"}
+        finally:
+            shutil.rmtree(parts_dir, ignore_errors=True)
@@ -0,0 +1,173 @@
+import asyncio
+import os
+import random
+import time
+import logging
+from typing import Dict, Any, Optional, List
+
+import httpx
+
+try:
+    import h2  # noqa: F401 - necessário para httpx com HTTP/2
+except ImportError:
+    h2 = None
+
+from services.assembly_service import (
+    TranscriptionConfig,
+    MAX_CONCURRENCY,
+    POLL_BASE_INTERVAL,
+    POLL_MAX_INTERVAL,
+    POLL_MAX_INTERVAL_LONG,
+    POLL_LONG_AFTER_SECONDS,
+    UPLOAD_BLOCKSIZE,
+    CONNECT_TIMEOUT,
+    UPLOAD_READ_TIMEOUT,
+    API_READ_TIMEOUT,
+    _API_KEY,
+)
+
+logger = logging.getLogger(__name__)
+
+
+async def _read_file_chunks(file_path: str, chunk_size: int = UPLOAD_BLOCKSIZE):
+    """Lê o arquivo em blocos sem bloquear o event loop (leitura de disco em thread)"""
+    with open(file_path, "rb") as f:
+        while True:
+            chunk = await asyncio.to_thread(f.read, chunk_size)
+            if not chunk:
+                break
+            yield chunk
+
+
+class AsyncAssemblyAIService:
+    """Versão assíncrona do AssemblyAIService (httpx.AsyncClient), para muitos jobs em um único event loop"""
+
+    def __init__(self):
+        self.api_key = _API_KEY
+        if not self.api_key:
+            raise ValueError("ASSEMBLYAI_API_KEY deve estar configurado")
+
+        self.headers = {"authorization": self.api_key}
+        self.base_url = "https://api.assemblyai.com/v2"
+        # HTTP/2: uploads e polling de vários jobs multiplexados na mesma conexão
+        self.client = httpx.AsyncClient(
+            http2=h2 is not None,
+            headers=self.headers,
+            limits=httpx.Limits(max_connections=20, max_keepalive_connections=10),
+            timeout=httpx.Timeout(API_READ_TIMEOUT, connect=CONNECT_TIMEOUT),
+        )
+
+    async def aclose(self):
+        await self.client.aclose()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
+
+    async def upload_file(self, file_path: str) -> Dict[str, Any]:
+        try:
+            if not os.path.exists(file_path):
+                return {"success": False, "error": f"Arquivo não encontrado: {file_path}"}
+            file_size = os.path.getsize(file_path)
+            if file_size > 5 * 1024 * 1024 * 1024:
+                return {"success": False, "error": "Arquivo muito grande (máximo 5GB)"}
+            logger.info("Iniciando upload do arquivo: %s (%s bytes)", file_path, file_size)
+            response = await self.client.post(
+                f"{self.base_url}/upload",
+                headers={"Content-Length": str(file_size)},
+                content=_read_file_chunks(file_path),
+                timeout=httpx.Timeout(UPLOAD_READ_TIMEOUT, connect=CONNECT_TIMEOUT),
+            )
+            response.raise_for_status()
+            upload_url = response.json()["upload_url"]
+            logger.info("Upload concluído: %s", upload_url)
+            return {"success": True, "upload_url": upload_url}
+        except httpx.HTTPError as e:
+            return {"success": False, "error": f"Erro na requisição de upload: {str(e)}"}
+        except Exception as e:
+            return {"success": False, "error": f"Erro inesperado durante upload: {str(e)}"}
+
+    async def start_transcription(self, audio_url: str,
+                                  config: Optional[TranscriptionConfig] = None) -> Dict[str, Any]:
+        try:
+            if not config:
+                config = TranscriptionConfig()
+            json_data = {
+                "audio_url": audio_url,
+                "language_code": config.language_code
+            }
+            if config.webhook_url:
+                json_data["webhook_url"] = config.webhook_url
+            if config.word_boost:
+                json_data["word_boost"] = config.word_boost
+                json_data["boost_param"] = config.boost_param
+            response = await self.client.post(f"{self.base_url}/transcript", json=json_data)
+            if response.is_error:
+                logger.error("Erro ao iniciar transcrição: %s. Resposta: %s", response.status_code, response.text)
+                return {"success": False, "error": f"Erro ao iniciar transcrição: {response.status_code}. Resposta AssemblyAI: {response.text}"}
+            return {"success": True, "transcript_id": response.json()["id"]}
+        except httpx.HTTPError as e:
+            return {"success": False, "error": f"Erro ao iniciar transcrição: {str(e)}"}
+        except Exception as e:
+            return {"success": False, "error": f"Erro inesperado ao iniciar transcrição: {str(e)}"}
+
+    async def get_transcription_status(self, transcript_id: str) -> Dict[str, Any]:
+        try:
+            response = await self.client.get(f"{self.base_url}/transcript/{transcript_id}")
+            response.raise_for_status()
+            result = response.json()
+            return {"success": True, "status": result["status"], "data": result}
+        except httpx.HTTPError as e:
+            return {"success": False, "error": f"Erro ao verificar status: {str(e)}"}
+
+    async def wait_for_completion(self, transcript_id: str, max_wait_time: int = 3600) -> Dict[str, Any]:
+        start_time = time.time()
+        attempt = 0
+        logger.info("Aguardando conclusão da transcrição: %s", transcript_id)
+        while time.time() - start_time < max_wait_time:
+            status_result = await self.get_transcription_status(transcript_id)
+            if not status_result["success"]:
+                return status_result
+            status = status_result["status"]
+            if status == "completed":
+                logger.info("Transcrição concluída: %s", transcript_id)
+                return {"success": True, "status": "completed", "data": status_result["data"]}
+            elif status == "error":
+                error_msg = status_result["data"].get("error", "Erro desconhecido na transcrição")
+                return {"success": False, "status": "error", "error": error_msg}
+            attempt = min(attempt + 1, 10)
+            elapsed = time.time() - start_time
+            max_interval = POLL_MAX_INTERVAL_LONG if elapsed > POLL_LONG_AFTER_SECONDS else POLL_MAX_INTERVAL
+            polling_interval = min(max_interval, POLL_BASE_INTERVAL * (2 ** attempt))
+            await asyncio.sleep(random.uniform(polling_interval / 2, polling_interval))
+        return {"success": False, "error": f"Timeout aguardando transcrição {transcript_id} após {max_wait_time} segundos"}
+
+    async def process_complete_transcription(self, file_path: str,
+                                             config: Optional[TranscriptionConfig] = None) -> Dict[str, Any]:
+        """Executa upload, criação e espera da transcrição de um arquivo local"""
+        upload = await self.upload_file(file_path)
+        if not upload.get("success"):
+            return upload
+        trans = await self.start_transcription(upload["upload_url"], config=config)
+        if not trans.get("success"):
+            return trans
+        final = await self.wait_for_completion(trans["transcript_id"])
+        final["transcript_id"] = trans["transcript_id"]
+        return final
+
+    async def process_batch(self, file_paths: List[str], max_concurrency: Optional[int] = None,
+                            config: Optional[TranscriptionConfig] = None) -> Dict[str, Dict[str, Any]]:
+        """Transcreve vários arquivos no mesmo event loop, limitado por um semáforo"""
+        semaphore = asyncio.Semaphore(max(1, max_concurrency or MAX_CONCURRENCY))
+
+        async def _one(path: str) -> Dict[str, Any]:
+            async with semaphore:
+                try:
+                    return await self.process_complete_transcription(path, config)
+                except Exception as e:
+                    return {"success": False, "error": f"Erro inesperado ao processar {path}: {str(e)}"}
+
+        results = await asyncio.gather(*(_one(path) for path in file_paths))
+        return dict(zip(file_paths, results))
@@ -1,17 +1,184 @@
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import os
 import tempfile
 import logging
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Optional, List, Union
 from urllib.parse import urlparse, unquote
 import mimetypes
 import subprocess
 import hashlib
+import json
+import errno
+import glob
+import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
+try:
+    import blake3
+except ImportError:
+    blake3 = None
 
 # Configuração de logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Download paralelo por HTTP Range (apenas quando o servidor anuncia Accept-Ranges: bytes)
+RANGED_DOWNLOAD_PARTS = 8
+RANGED_DOWNLOAD_MIN_SIZE = 32 * 1024 * 1024  # abaixo disso, um único stream é suficiente
+# Algoritmo do hash de conteúdo (chave de deduplicação): BLAKE3 quando disponível, senão SHA-256
+FILE_HASH_ALGO = "blake3" if blake3 is not None else "sha256"
+# Fração da duração do vídeo que o áudio extraído via pipe pode perder (arredondamento de frames)
+PIPED_AUDIO_DURATION_TOLERANCE = 0.01
+# Cortes paralelos do ffmpeg em split_video_by_size
+SPLIT_MAX_WORKERS = 8
+
+# Caminhos comuns de binários (incluindo Nix) caso não estejam no PATH
+_BINARY_SEARCH_PATHS = [
+    '/usr/bin/{name}',
+    '/usr/local/bin/{name}',
+    '/opt/homebrew/bin/{name}',
+    '/nix/store/*/bin/{name}',  # Nixpacks no Railway
+]
+
+
+@lru_cache(maxsize=None)
+def _find_binary(name: str) -> Optional[str]:
+    """Localiza um binário uma única vez por processo (PATH primeiro, depois caminhos conhecidos)"""
+    path = shutil.which(name)
+    if path:
+        logger.info(f"{name} encontrado no PATH: {path}")
+        return path
+    for pattern in _BINARY_SEARCH_PATHS:
+        candidate = pattern.format(name=name)
+        if '*' in candidate:
+            matches = glob.glob(candidate)
+            if not matches:
+                continue
+            candidate = matches[0]
+        try:
+            subprocess.run([candidate, '-version'], capture_output=True, check=True, timeout=5)
+            logger.info(f"{name} encontrado em: {candidate}")
+            return candidate
+        except (subprocess.CalledProcessError, FileNotFoundError, subprocess.TimeoutExpired):
+            continue
+    return None
+
+
+def find_ffmpeg() -> Optional[str]:
+    return _find_binary('ffmpeg')
+
+
+def find_ffprobe() -> Optional[str]:
+    return _find_binary('ffprobe')
+
+
+def fadvise(fd: int, advice: str) -> None:
+    """Dica de acesso ao page cache (posix_fadvise) para o arquivo inteiro; ignorada fora de POSIX"""
+    if not hasattr(os, "posix_fadvise"):
+        return
+    try:
+        os.posix_fadvise(fd, 0, 0, getattr(os, advice))
+    except OSError:
+        pass
+
+
+def _probe_duration(path: str) -> Optional[float]:
+    """Duração (s) da primeira faixa de áudio, ou do contêiner quando a faixa não informa; None se o ffprobe falhar"""
+    ffprobe_path = find_ffprobe()
+    if not ffprobe_path:
+        return None
+    cmd = [ffprobe_path, '-v', 'error', '-select_streams', 'a:0',
+           '-show_entries', 'stream=duration:format=duration', '-of', 'json', path]
+    try:
+        result = subprocess.run(cmd, capture_output=True, text=True, check=True, timeout=60)
+        info = json.loads(result.stdout)
+        streams = info.get('streams') or [{}]
+        duration = streams[0].get('duration') or info.get('format', {}).get('duration')
+        return float(duration) if duration else None
+    except (subprocess.SubprocessError, OSError, ValueError):
+        return None
+
+
+def _new_file_hasher(max_threads: int = 1):
+    """Cria o hasher de FILE_HASH_ALGO (o mesmo para hash em stream e hash de arquivo em disco)"""
+    if blake3 is not None:
+        return blake3.blake3(max_threads=max_threads)
+    return hashlib.sha256(usedforsecurity=False)
+
+
+class _StreamingAudioExtractor:
+    """Extrai o áudio (MP3) com ffmpeg enquanto o vídeo é baixado, alimentando o stdin do processo"""
+    
+    def __init__(self, ffmpeg_path: str, output_path: str, chunk_size: int):
+        self.output_path = output_path
+        self.size = 0
+        self.failed = False
+        self._stderr = b""
+        self.proc = subprocess.Popen(
+            [
+                ffmpeg_path, '-hide_banner', '-loglevel', 'error',
+                '-xerror',  # erro de demux no pipe deve falhar, não virar fim de arquivo (MP3 truncado)
+                '-i', 'pipe:0',
+                '-vn',  # Sem vídeo
+                '-acodec', 'libmp3lame',  # Codec MP3
+                '-ab', '192k',  # Bitrate
+                '-ar', '44100',  # Sample rate
+                '-f', 'mp3', 'pipe:1'
+            ],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE
+        )
+        self._stdout_reader = threading.Thread(target=self._read_output, args=(chunk_size,), daemon=True)
+        self._stderr_reader = threading.Thread(target=self._read_stderr, daemon=True)
+        self._stdout_reader.start()
+        self._stderr_reader.start()
+    
+    def _read_output(self, chunk_size: int):
+        with open(self.output_path, 'wb') as out:
+            for chunk in iter(lambda: self.proc.stdout.read(chunk_size), b""):
+                out.write(chunk)
+                self.size += len(chunk)
+    
+    def _read_stderr(self):
+        self._stderr = self.proc.stderr.read()
+    
+    def feed(self, chunk: bytes):
+        if self.failed:
+            return
+        try:
+            self.proc.stdin.write(chunk)
+        except (BrokenPipeError, OSError):
+            # ffmpeg encerrou (ex: MP4 com moov no final não é decodificável via pipe); o download continua em disco
+            self.failed = True
+    
+    def finish(self, timeout: int = 300) -> Dict[str, Any]:
+        try:
+            self.proc.stdin.close()
+        except OSError:
+            pass
+        try:
+            returncode = self.proc.wait(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            self.abort()
+            return {"success": False, "error": "Timeout durante extração de áudio em streaming"}
+        self._stdout_reader.join()
+        self._stderr_reader.join()
+        if returncode != 0 or self.size == 0:
+            return {"success": False, "error": f"Erro no ffmpeg (código {returncode}): {self._stderr.decode(errors='replace')}"}
+        return {"success": True, "audio_path": self.output_path, "file_size": self.size}
+    
+    def abort(self):
+        self.proc.kill()
+        self.proc.wait()
+        self._stdout_reader.join()
+        self._stderr_reader.join()
+        if os.path.exists(self.output_path):
+            os.remove(self.output_path)
+
+
 class DownloadService:
     """Serviço melhorado para download de arquivos de vídeo e áudio"""
     
@@ -21,7 +188,20 @@ class DownloadService:
             'audio': ['.mp3', '.wav', '.aac', '.flac', '.ogg', '.m4a', '.wma']
         }
         self.max_file_size = 5 * 1024 * 1024 * 1024  # 5GB
-        self.chunk_size = 8192  # 8KB chunks
+        self.chunk_size = 1024 * 1024  # 1MB chunks (menos iterações e syscalls por GB)
+        self.write_buffer_size = 4 * 1024 * 1024  # 4MB de buffer de escrita
+        
+        # Sessão persistente: reaproveita conexões keep-alive (TLS) entre HEAD, GET e partes do download paralelo
+        self.session = requests.Session()
+        # Mídia já é comprimida: pedir o corpo sem gzip evita trabalho inútil no servidor
+        self.session.headers["Accept-Encoding"] = "identity"
+        adapter = HTTPAdapter(
+            pool_connections=16,
+            pool_maxsize=64,
+            max_retries=Retry(total=3, backoff_factor=0.3),
+        )
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
         
         logger.info("Serviço de download inicializado")
     
@@ -38,7 +218,7 @@ class DownloadService:
                 return extension.lower()
         return '.mp4'
     
-    def _validate_file_format(self, file_path: str) -> Dict[str, Any]:
+    def _validate_file_format(self, file_path: str, file_size: Optional[int] = None) -> Dict[str, Any]:
         try:
             extension = os.path.splitext(file_path)[1].lower()
             all_supported = self.supported_formats['video'] + self.supported_formats['audio']
@@ -47,7 +227,8 @@ class DownloadService:
                     "valid": False,
                     "error": f"Formato não suportado: {extension}. Formatos aceitos: {', '.join(all_supported)}"
                 }
-            file_size = os.path.getsize(file_path)
+            if file_size is None:
+                file_size = os.path.getsize(file_path)
             if file_size > self.max_file_size:
                 return {
                     "valid": False,
@@ -60,43 +241,7 @@ class DownloadService:
     
     def _extract_audio_from_video(self, video_path: str, output_path: str) -> Dict[str, Any]:
         try:
-            # Procurar FFmpeg nos caminhos comuns (incluindo Nix)
-            possible_paths = [
-                'ffmpeg',  # PATH padrão
-                '/usr/bin/ffmpeg',
-                '/usr/local/bin/ffmpeg',
-                '/opt/homebrew/bin/ffmpeg',
-                '/nix/store/*/bin/ffmpeg',  # Nixpacks no Railway
-            ]
-            
-            ffmpeg_path = None
-            
-            # Tentar encontrar via 'which' primeiro (mais confiável)
-            try:
-                which_result = subprocess.run(['which', 'ffmpeg'], capture_output=True, text=True, timeout=5)
-                if which_result.returncode == 0:
-                    ffmpeg_path = which_result.stdout.strip()
-                    logger.info(f"FFmpeg encontrado via 'which': {ffmpeg_path}")
-            except Exception:
-                pass
-            
-            # Se não encontrou via 'which', tentar caminhos específicos
-            if not ffmpeg_path:
-                for path in possible_paths:
-                    try:
-                        # Expandir glob para Nix
-                        if '*' in path:
-                            import glob
-                            matches = glob.glob(path)
-                            if matches:
-                                path = matches[0]
-                        
-                        result = subprocess.run([path, '-version'], capture_output=True, check=True, timeout=5)
-                        ffmpeg_path = path
-                        logger.info(f"FFmpeg encontrado em: {path}")
-                        break
-                    except (subprocess.CalledProcessError, FileNotFoundError, subprocess.TimeoutExpired):
-                        continue
+            ffmpeg_path = find_ffmpeg()
             
             if not ffmpeg_path:
                 error_msg = "FFmpeg não está instalado. Certifique-se de que o FFmpeg está incluído nas dependências do sistema (nixpacks.toml ou Aptfile)."
@@ -138,13 +283,90 @@ class DownloadService:
             traceback.print_exc()
             return {"success": False, "error": error_msg}
     
-    def download_file(self, url: str, job_id: str) -> Dict[str, Any]:
+    def _open_preallocated(self, path: str, size: Optional[int]) -> int:
+        """Abre o arquivo de destino reservando `size` bytes contíguos (posix_fallocate) quando o tamanho é conhecido"""
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+        if size and hasattr(os, "posix_fallocate"):
+            try:
+                os.posix_fallocate(fd, 0, size)
+            except OSError as e:
+                if e.errno == errno.ENOSPC:
+                    # Falha antes de gastar banda: não há espaço para o arquivo inteiro
+                    os.close(fd)
+                    os.remove(path)
+                    raise
+                # Sistema de arquivos sem suporte (ex: EOPNOTSUPP/EINVAL): seguir sem pré-alocação
+                logger.debug(f"posix_fallocate indisponível para {path}: {e}")
+        return fd
+    
+    def _download_ranged(self, urls: List[str], path: str, size: int, parts: int = RANGED_DOWNLOAD_PARTS) -> None:
+        """Baixa o arquivo em `parts` requisições Range paralelas, cada uma gravando no seu offset (os.pwrite)
+        
+        As partes são distribuídas em rodízio entre `urls` (espelhos do mesmo arquivo), somando a banda dos servidores.
+        """
+        parts = max(parts, len(urls))
+        part_size = -(-size // parts)
+        ranges = [(lo, min(lo + part_size, size) - 1) for lo in range(0, size, part_size)]
+        fd = self._open_preallocated(path, size)
+        
+        def _fetch(url: str, lo: int, hi: int):
+            with self.session.get(url, headers={"Range": f"bytes={lo}-{hi}"}, stream=True, timeout=60) as response:
+                response.raise_for_status()
+                if response.status_code != 206:
+                    raise IOError(f"Servidor ignorou o header Range (status {response.status_code})")
+                offset = lo
+                for chunk in response.iter_content(chunk_size=self.chunk_size):
+                    if chunk:
+                        os.pwrite(fd, chunk, offset)
+                        offset += len(chunk)
+            if offset != hi + 1:
+                raise IOError(f"Parte incompleta: bytes {lo}-{hi} (recebido até {offset - 1})")
+        
+        try:
+            logger.info(f"Download paralelo: {len(ranges)} partes de até {part_size} bytes")
+            with ThreadPoolExecutor(max_workers=len(ranges)) as executor:
+                futures = [executor.submit(_fetch, urls[i % len(urls)], lo, hi) for i, (lo, hi) in enumerate(ranges)]
+                for future in futures:
+                    future.result()
+        finally:
+            os.close(fd)
+    
+    def _ranged_mirrors(self, mirrors: List[str], size: int) -> List[str]:
+        """Consulta os espelhos (HEAD) e retorna os que aceitam Range; levanta ValueError se algum tiver outro tamanho"""
+        def _head(mirror: str):
+            try:
+                return self.session.head(mirror, timeout=30, allow_redirects=True).headers
+            except requests.exceptions.RequestException as e:
+                logger.warning(f"Espelho ignorado ({mirror}): {e}")
+                return None
+        
+        usable = []
+        with ThreadPoolExecutor(max_workers=len(mirrors)) as executor:
+            for mirror, headers in zip(mirrors, executor.map(_head, mirrors)):
+                if headers is None:
+                    continue
+                content_length = headers.get('content-length')
+                if content_length and int(content_length) != size:
+                    raise ValueError(f"Espelho com tamanho divergente: {mirror} ({content_length} bytes, esperado {size})")
+                if content_length and headers.get('accept-ranges', '').lower() == 'bytes':
+                    usable.append(mirror)
+                else:
+                    logger.warning(f"Espelho ignorado ({mirror}): sem suporte a Range")
+        return usable
+    
+    def download_file(self, url: Union[str, List[str]], job_id: str) -> Dict[str, Any]:
         try:
-            logger.info(f"Iniciando download: {url}")
+            # Lista de URLs = espelhos do mesmo arquivo; o primeiro é a origem principal
+            urls = [url] if isinstance(url, str) else list(url)
+            url = urls[0]
+            logger.info(f"Iniciando download: {url}" + (f" (+{len(urls) - 1} espelhos)" if len(urls) > 1 else ""))
+            file_size = None
+            accept_ranges = False
             try:
-                head_response = requests.head(url, timeout=30, allow_redirects=True)
+                head_response = self.session.head(url, timeout=30, allow_redirects=True)
                 content_type = head_response.headers.get('content-type', '')
                 content_length = head_response.headers.get('content-length')
+                accept_ranges = head_response.headers.get('accept-ranges', '').lower() == 'bytes'
                 if content_length:
                     file_size = int(content_length)
                     if file_size > self.max_file_size:
@@ -154,33 +376,86 @@ class DownloadService:
             extension = self._get_file_extension(url, content_type)
             temp_dir = tempfile.gettempdir()
             original_file = os.path.join(temp_dir, f"{job_id}_original{extension}")
-            with requests.get(url, stream=True, timeout=60) as response:
-                response.raise_for_status()
-                total_size = 0
-                with open(original_file, 'wb') as f:
-                    for chunk in response.iter_content(chunk_size=self.chunk_size):
-                        if chunk:
-                            f.write(chunk)
-                            total_size += len(chunk)
-                            if total_size > self.max_file_size:
-                                os.remove(original_file)
-                                return {"success": False, "error": "Arquivo excede tamanho máximo permitido"}
+            audio_file = os.path.join(temp_dir, f"{job_id}_audio.mp3")
+            # Hash de conteúdo (chave de deduplicação) sempre sobre os bytes baixados, nunca sobre o MP3 extraído:
+            # o MP3 do pipe e o do disco diferem (cabeçalho Xing/LAME só em saída seekable). No stream é calculado
+            # sem reler o arquivo; no download paralelo (partes fora de ordem) é calculado do arquivo em disco.
+            stream_hash = None
+            # Vídeo: o áudio é extraído via pipe durante o download (o vídeo em disco fica só como fallback)
+            extractor = None
+            downloaded = False
+            if accept_ranges and file_size and file_size >= RANGED_DOWNLOAD_MIN_SIZE and hasattr(os, "pwrite"):
+                try:
+                    mirrors = self._ranged_mirrors(urls[1:], file_size) if len(urls) > 1 else []
+                    self._download_ranged([url] + mirrors, original_file, file_size)
+                    total_size = file_size
+                    downloaded = True
+                except Exception as e:
+                    logger.warning(f"Download paralelo falhou, usando stream único: {e}")
+            if not downloaded:
+                with self.session.get(url, stream=True, timeout=60) as response:
+                    response.raise_for_status()
+                    total_size = 0
+                    stream_hash = _new_file_hasher()
+                    if extension in self.supported_formats['video'] and find_ffmpeg():
+                        extractor = _StreamingAudioExtractor(find_ffmpeg(), audio_file, self.chunk_size)
+                    try:
+                        fd = self._open_preallocated(original_file, file_size)
+                        fadvise(fd, "POSIX_FADV_SEQUENTIAL")
+                        with os.fdopen(fd, 'wb', buffering=self.write_buffer_size) as f:
+                            for chunk in response.iter_content(chunk_size=self.chunk_size):
+                                if chunk:
+                                    f.write(chunk)
+                                    stream_hash.update(chunk)
+                                    if extractor is not None:
+                                        extractor.feed(chunk)
+                                    total_size += len(chunk)
+                                    if total_size > self.max_file_size:
+                                        if extractor is not None:
+                                            extractor.abort()
+                                        os.remove(original_file)
+                                        return {"success": False, "error": "Arquivo excede tamanho máximo permitido"}
+                            # A pré-alocação usa o Content-Length do HEAD; ajustar ao que de fato chegou
+                            f.truncate()
+                    except BaseException:
+                        if extractor is not None:
+                            extractor.abort()
+                        raise
             logger.info(f"Download concluído: {original_file} ({total_size} bytes)")
-            validation = self._validate_file_format(original_file)
+            streamed = extractor.finish() if extractor is not None else None
+            if streamed and streamed["success"]:
+                # Só confiar no áudio do pipe se a duração bater com a do vídeo completo em disco
+                source_duration = _probe_duration(original_file)
+                piped_duration = _probe_duration(audio_file)
+                if source_duration is None or piped_duration is None or \
+                        piped_duration < source_duration - max(1.0, source_duration * PIPED_AUDIO_DURATION_TOLERANCE):
+                    streamed = {"success": False, "error": f"Áudio extraído via pipe incompleto ({piped_duration}s de {source_duration}s)"}
+            validation = self._validate_file_format(original_file, file_size=total_size)
             if not validation["valid"]:
                 os.remove(original_file)
+                if streamed and streamed["success"]:
+                    os.remove(audio_file)
                 return {"success": False, "error": validation["error"]}
+            file_hash = stream_hash.hexdigest() if stream_hash is not None else self._calculate_file_hash(original_file)
             if validation["media_type"] == "video":
-                audio_file = os.path.join(temp_dir, f"{job_id}_audio.mp3")
-                extraction_result = self._extract_audio_from_video(original_file, audio_file)
-                os.remove(original_file)
-                if not extraction_result["success"]:
-                    return extraction_result
-                final_file = audio_file
+                if streamed and streamed["success"]:
+                    logger.info(f"Áudio extraído durante o download: {audio_file} ({streamed['file_size']} bytes)")
+                    os.remove(original_file)
+                    final_file = audio_file
+                    final_size = streamed["file_size"]
+                else:
+                    if streamed:
+                        logger.warning(f"Extração via pipe falhou, extraindo do arquivo em disco: {streamed['error']}")
+                    extraction_result = self._extract_audio_from_video(original_file, audio_file)
+                    os.remove(original_file)
+                    if not extraction_result["success"]:
+                        return extraction_result
+                    final_file = audio_file
+                    final_size = os.path.getsize(final_file)
             else:
                 final_file = original_file
-            file_hash = self._calculate_file_hash(final_file)
-            return {"success": True, "file_path": final_file, "media_type": validation["media_type"], "file_size": os.path.getsize(final_file), "file_hash": file_hash}
+                final_size = total_size
+            return {"success": True, "file_path": final_file, "media_type": validation["media_type"], "file_size": final_size, "file_hash": file_hash, "file_hash_algo": FILE_HASH_ALGO}
         except requests.exceptions.Timeout:
             return {"success": False, "error": "Timeout durante download do arquivo"}
         except requests.exceptions.RequestException as e:
@@ -189,11 +464,25 @@ class DownloadService:
             return {"success": False, "error": f"Erro inesperado durante download: {str(e)}"}
     
     def _calculate_file_hash(self, file_path: str) -> str:
-        hash_sha256 = hashlib.sha256()
+        if blake3 is not None and os.path.getsize(file_path) > 0:
+            # Leitura via mmap com árvore BLAKE3 paralela em várias threads
+            hasher = _new_file_hasher(max_threads=blake3.blake3.AUTO)
+            hasher.update_mmap(file_path)
+            return hasher.hexdigest()
         with open(file_path, "rb") as f:
-            for chunk in iter(lambda: f.read(4096), b""):
-                hash_sha256.update(chunk)
-        return hash_sha256.hexdigest()
+            fadvise(f.fileno(), "POSIX_FADV_SEQUENTIAL")
+            if hasattr(hashlib, "file_digest") and blake3 is None:
+                # Python 3.11+: laço de leitura e hash inteiramente em C
+                return hashlib.file_digest(f, _new_file_hasher).hexdigest()
+            hasher = _new_file_hasher()
+            # Buffer único reaproveitado: sem alocar um bytes novo a cada bloco
+            buffer = memoryview(bytearray(self.chunk_size))
+            while True:
+                n = f.readinto(buffer)
+                if not n:
+                    break
+                hasher.update(buffer[:n])
+        return hasher.hexdigest()
     
     def cleanup_file(self, file_path: str) -> bool:
         try:
@@ -206,9 +495,19 @@ class DownloadService:
             logger.error(f"Erro ao remover arquivo {file_path}: {str(e)}")
             return False
     
+    def close(self):
+        """Fecha a sessão HTTP e suas conexões"""
+        self.session.close()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc_info):
+        self.close()
+    
     def get_file_info(self, url: str) -> Dict[str, Any]:
         try:
-            response = requests.head(url, timeout=30, allow_redirects=True)
+            response = self.session.head(url, timeout=30, allow_redirects=True)
             response.raise_for_status()
             content_type = response.headers.get('content-type', '')
             content_length = response.headers.get('content-length')
@@ -218,28 +517,36 @@ class DownloadService:
         except Exception as e:
             return {"success": False, "error": f"Erro ao obter informações do arquivo: {str(e)}"}
     
+    def get_file_info_many(self, urls: List[str], max_concurrency: int = 16) -> List[Dict[str, Any]]:
+        """get_file_info para vários URLs com HEADs simultâneos (mesma sessão/pool); resultados na ordem de `urls`"""
+        if not urls:
+            return []
+        with ThreadPoolExecutor(max_workers=min(len(urls), max_concurrency)) as executor:
+            return list(executor.map(self.get_file_info, urls))
+    
     def split_video_by_size(self, video_path: str, max_size_mb: int = 400) -> List[str]:
         import math
-        import shutil
         max_size_bytes = max_size_mb * 1024 * 1024
         file_size = os.path.getsize(video_path)
         if file_size <= max_size_bytes:
             return [video_path]
-        import subprocess
         import json as pyjson
-        ffprobe_cmd = ['ffprobe', '-v', 'error', '-show_entries', 'format=duration', '-of', 'json', video_path]
+        ffmpeg_path = find_ffmpeg() or 'ffmpeg'
+        ffprobe_cmd = [find_ffprobe() or 'ffprobe', '-v', 'error', '-show_entries', 'format=duration', '-of', 'json', video_path]
         result = subprocess.run(ffprobe_cmd, capture_output=True, text=True)
         duration = float(pyjson.loads(result.stdout)['format']['duration'])
         num_parts = math.ceil(file_size / max_size_bytes)
         part_duration = duration / num_parts
-        split_paths = []
-        for i in range(num_parts):
-            start = i * part_duration
-            output_path = f"{video_path}.part{i+1}.mp4"
-            ffmpeg_cmd = ['ffmpeg', '-y', '-i', video_path, '-ss', str(int(start)), '-t', str(int(part_duration)), '-c', 'copy', output_path]
+        split_paths = [f"{video_path}.part{i+1}.mp4" for i in range(num_parts)]
+        ffmpeg_cmds = [
+            [ffmpeg_path, '-y', '-i', video_path, '-ss', str(int(i * part_duration)), '-t', str(int(part_duration)), '-c', 'copy', output_path]
+            for i, output_path in enumerate(split_paths)
+        ]
+        for i, ffmpeg_cmd in enumerate(ffmpeg_cmds):
             logger.info(f"Cortando parte {i+1}/{num_parts}: {' '.join(ffmpeg_cmd)}")
-            subprocess.run(ffmpeg_cmd, capture_output=True, check=True)
-            split_paths.append(output_path)
+        # Com -c copy não há recodificação: o limite é a leitura do disco, não a CPU
+        with ThreadPoolExecutor(max_workers=min(num_parts, SPLIT_MAX_WORKERS)) as executor:
+            list(executor.map(lambda cmd: subprocess.run(cmd, capture_output=True, check=True), ffmpeg_cmds))
         try:
             os.remove(video_path)
         except Exception as e:
@@ -1,24 +1,59 @@
 import os
-from openai import OpenAI
+import asyncio
+from typing import List
+import httpx
+from openai import OpenAI, AsyncOpenAI
+
+try:
+    import h2  # noqa: F401 - necessário para httpx com HTTP/2
+except ImportError:
+    h2 = None
 
 
 _client = None
+_async_client = None
+
+# Requisições simultâneas em gpt_completion_many (o limite real é o RPM da conta)
+DEFAULT_BATCH_CONCURRENCY = 20
+
+# HTTP/2: várias requisições simultâneas multiplexadas na mesma conexão com a API
+_HTTP_LIMITS = httpx.Limits(max_keepalive_connections=32, max_connections=64)
+# O SDK adota o timeout do http_client injetado: manter a leitura longa padrão (resumos de reuniões inteiras)
+_HTTP_TIMEOUT = httpx.Timeout(600, connect=10)
+
+
+def _get_api_key() -> str:
+    api_key = os.getenv("OPENAI_API_KEY")
+    if not api_key:
+        raise ValueError(
+            "OPENAI_API_KEY não está configurada. "
+            "Por favor, configure a variável de ambiente OPENAI_API_KEY."
+        )
+    return api_key
 
 
 def _get_client() -> OpenAI:
     """Obtém o cliente OpenAI, inicializando-o se necessário."""
     global _client
     if _client is None:
-        api_key = os.getenv("OPENAI_API_KEY")
-        if not api_key:
-            raise ValueError(
-                "OPENAI_API_KEY não está configurada. "
-                "Por favor, configure a variável de ambiente OPENAI_API_KEY."
-            )
-        _client = OpenAI(api_key=api_key)
+        _client = OpenAI(
+            api_key=_get_api_key(),
+            http_client=httpx.Client(http2=h2 is not None, limits=_HTTP_LIMITS, timeout=_HTTP_TIMEOUT),
+        )
     return _client
 
 
+def _get_async_client() -> AsyncOpenAI:
+    """Obtém o cliente OpenAI assíncrono compartilhado, inicializando-o se necessário."""
+    global _async_client
+    if _async_client is None:
+        _async_client = AsyncOpenAI(
+            api_key=_get_api_key(),
+            http_client=httpx.AsyncClient(http2=h2 is not None, limits=_HTTP_LIMITS, timeout=_HTTP_TIMEOUT),
+        )
+    return _async_client
+
+
 def gpt_4_completion(prompt: str, max_tokens: int = 512) -> str:
     client = _get_client()
     response = client.chat.completions.create(
@@ -40,3 +75,36 @@ def gpt_3_5_completion(prompt: str, max_tokens: int = 512) -> str:
     )
     return response.choices[0].message.content.strip()
 
+
+
+async def _completion_async(model: str, prompt: str, max_tokens: int = 512) -> str:
+    client = _get_async_client()
+    response = await client.chat.completions.create(
+        model=model,
+        messages=[{"role": "user", "content": prompt}],
+        max_tokens=max_tokens,
+        temperature=0.2,
+    )
+    return response.choices[0].message.content.strip()
+
+
+async def gpt_4_completion_async(prompt: str, max_tokens: int = 512) -> str:
+    """Versão assíncrona de gpt_4_completion (não bloqueia o event loop)."""
+    return await _completion_async("gpt-4o", prompt, max_tokens)
+
+
+async def gpt_3_5_completion_async(prompt: str, max_tokens: int = 512) -> str:
+    """Versão assíncrona de gpt_3_5_completion (não bloqueia o event loop)."""
+    return await _completion_async("gpt-3.5-turbo", prompt, max_tokens)
+
+
+async def gpt_completion_many(prompts: List[str], model: str = "gpt-4o", max_tokens: int = 512,
+                              concurrency: int = DEFAULT_BATCH_CONCURRENCY) -> List[str]:
+    """Executa vários prompts em paralelo, limitados por um semáforo; resultados na ordem de `prompts`."""
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def _one(prompt: str) -> str:
+        async with semaphore:
+            return await _completion_async(model, prompt, max_tokens)
+
+    return await asyncio.gather(*(_one(prompt) for prompt in prompts))
@@ -1,18 +1,39 @@
 import os
 import logging
+import threading
 from urllib.parse import urlparse
 from supabase import create_client, Client
-from typing import Optional
+from typing import Optional, List, Dict, Any
 
 logger = logging.getLogger(__name__)
 
+# Limite de linhas por requisição no insert em lote (payload do PostgREST)
+MAX_ROWS_PER_REQUEST = 500
+
 
 def _clean_env_value(v: str) -> str:
     return (v or "").strip().strip('"').strip("'")
 
 
+# Clientes por (url, chave), sem limite: os tenants são um conjunto pequeno e uma eviction
+# descartaria o cliente sem fechar o pool de conexões dele
+_clients: Dict[tuple, Client] = {}
+_clients_lock = threading.Lock()
+
+
+def _build_client(url: str, key: str) -> Client:
+    """Cliente Supabase reutilizado por (url, chave): cada tenant/role mantém seu pool de conexões"""
+    client = _clients.get((url, key))
+    if client is None:
+        with _clients_lock:
+            client = _clients.get((url, key))
+            if client is None:
+                client = _clients[(url, key)] = create_client(url, key)
+    return client
+
+
 def get_supabase_client() -> Client:
-    """Cria cliente Supabase validando URL/chave e registrando host alvo.
+    """Retorna cliente Supabase validando URL/chave e registrando host alvo.
     
     Suporta multi-tenancy: tenta obter credenciais do tenant atual primeiro,
     depois faz fallback para variáveis de ambiente.
@@ -29,7 +50,7 @@ def get_supabase_client() -> Client:
                 logger.info(f"[Supabase] Usando credenciais do tenant: {tenant_ctx.tenant_slug} | URL: {url[:50]}...")
                 parsed = urlparse(url)
                 if parsed.scheme and parsed.netloc:
-                    return create_client(url, key)
+                    return _build_client(url, key)
                 else:
                     logger.warning(f"[Supabase] URL do tenant inválida: {url}, usando fallback")
     except Exception as e:
@@ -59,12 +80,12 @@ def get_supabase_client() -> Client:
     except Exception:
         pass
     
-    return create_client(url, key)
+    return _build_client(url, key)
 
 
 def get_supabase_service_client() -> Client:
     """
-    Cria cliente Supabase com SERVICE_ROLE (bypass RLS).
+    Retorna cliente Supabase com SERVICE_ROLE (bypass RLS).
     
     Necessário para operações administrativas e bypass de RLS.
     O middleware deve ter buscado serviceRole do Registry previamente.
@@ -85,7 +106,7 @@ def get_supabase_service_client() -> Client:
                     logger.info(f"[Supabase] Usando SERVICE_ROLE do tenant: {tenant_ctx.tenant_slug}")
                     parsed = urlparse(url)
                     if parsed.scheme and parsed.netloc:
-                        return create_client(url, service_key)
+                        return _build_client(url, service_key)
                     else:
                         logger.warning(f"[Supabase] URL do tenant inválida: {url}, usando fallback")
             else:
@@ -102,7 +123,7 @@ def get_supabase_service_client() -> Client:
         raise ValueError("SUPABASE_URL e SUPABASE_SERVICE_KEY devem estar configurados no .env")
     
     logger.info("[Supabase] Usando SERVICE_ROLE do .env (fallback)")
-    return create_client(url, service_key)
+    return _build_client(url, service_key)
 
 
 # Alias para compatibilidade
@@ -122,7 +143,7 @@ def insert_transcription(data, supabase_url: str = None, service_key: str = None
     # Se credenciais explícitas foram passadas, usar elas (para background tasks)
     if supabase_url and service_key:
         logger.info(f"[Supabase] Usando credenciais explícitas para insert | URL: {supabase_url[:50]}...")
-        supabase = create_client(supabase_url, service_key)
+        supabase = _build_client(supabase_url, service_key)
     else:
         # Caso contrário, usar contexto (requisições HTTP normais)
         supabase = get_supabase_service_client()
@@ -135,6 +156,36 @@ def insert_transcription(data, supabase_url: str = None, service_key: str = None
     return result
 
 
+def insert_transcriptions_bulk(rows: List[Dict[str, Any]], supabase_url: str = None, service_key: str = None) -> List[Dict[str, Any]]:
+    """Insere várias transcrições com uma requisição a cada MAX_ROWS_PER_REQUEST linhas
+    
+    Usa SERVICE_ROLE para bypass RLS, pois é uma operação de sistema.
+    
+    Args:
+        rows: Lista de dados das transcrições
+        supabase_url: URL do Supabase (opcional, para background tasks)
+        service_key: Service role key (opcional, para background tasks)
+    
+    Returns:
+        Linhas inseridas, na mesma ordem de `rows`
+    """
+    if not rows:
+        return []
+    if supabase_url and service_key:
+        logger.info(f"[Supabase] Usando credenciais explícitas para insert em lote | URL: {supabase_url[:50]}...")
+        supabase = _build_client(supabase_url, service_key)
+    else:
+        supabase = get_supabase_service_client()
+    
+    inserted = []
+    for start in range(0, len(rows), MAX_ROWS_PER_REQUEST):
+        # Mesmo padrão do insert unitário: sem user_id, grava NULL (em cópias, sem alterar os dicts do chamador)
+        batch = [{**row, "user_id": row.get("user_id")} for row in rows[start:start + MAX_ROWS_PER_REQUEST]]
+        result = supabase.table("transcriptions").insert(batch).execute()
+        inserted.extend(result.data)
+    return inserted
+
+
 def update_transcription(transcription_id, data, supabase_url: str = None, service_key: str = None):
     """Atualiza uma transcrição existente
     
@@ -150,7 +201,7 @@ def update_transcription(transcription_id, data, supabase_url: str = None, servi
         # Se credenciais explícitas foram passadas, usar elas (para background tasks)
         if supabase_url and service_key:
             logger.info(f"[Supabase] Usando credenciais explícitas para update | URL: {supabase_url[:50]}...")
-            supabase = create_client(supabase_url, service_key)
+            supabase = _build_client(supabase_url, service_key)
         else:
             supabase = get_supabase_service_client()
         print(f"[SUPABASE] Atualizando transcription_id={transcription_id}")
@@ -165,6 +216,25 @@ def update_transcription(transcription_id, data, supabase_url: str = None, servi
         raise
 
 
+def update_transcription_by_job_id(job_id, data, supabase_url: str = None, service_key: str = None):
+    """Atualiza a transcrição de um job (registro criado antes do processamento em background)
+    
+    Usa SERVICE_ROLE para bypass RLS, pois é uma operação de sistema.
+    
+    Args:
+        job_id: ID do job
+        data: Dados a atualizar
+        supabase_url: URL do Supabase (opcional, para background tasks)
+        service_key: Service role key (opcional, para background tasks)
+    """
+    if supabase_url and service_key:
+        supabase = _build_client(supabase_url, service_key)
+    else:
+        supabase = get_supabase_service_client()
+    print(f"[SUPABASE] Atualizando job_id={job_id} | Campos: {list(data.keys())}")
+    return supabase.table("transcriptions").update(data).eq("job_id", job_id).execute()
+
+
 def get_transcription(transcription_id):
     """Busca uma transcrição por ID"""
     supabase = get_supabase_client()
@@ -172,9 +242,29 @@ def get_transcription(transcription_id):
     return result
 
 
-def get_transcriptions_by_user(user_id):
-    """Busca transcrições de um usuário específico"""
+# Colunas da listagem por usuário (sem o texto da transcrição, que pode ter megabytes)
+TRANSCRIPTION_LIST_COLUMNS = ("id", "job_id", "video_url", "created_at", "status")
+
+
+def get_transcriptions_by_user(user_id, *, limit: int = 50, before_id=None,
+                               columns=TRANSCRIPTION_LIST_COLUMNS):
+    """Busca transcrições de um usuário específico, paginadas por id (mais recentes primeiro)
+    
+    Args:
+        user_id: ID do usuário
+        limit: Máximo de registros por página
+        before_id: Retorna apenas registros com id menor (último id da página anterior)
+        columns: Colunas retornadas
+    """
     supabase = get_supabase_client()
-    result = supabase.table("transcriptions").select("*").eq("user_id", user_id).execute()
-    return result
+    query = (
+        supabase.table("transcriptions")
+        .select(",".join(columns))
+        .eq("user_id", user_id)
+        .order("id", desc=True)
+        .limit(limit)
+    )
+    if before_id is not None:
+        query = query.lt("id", before_id)
+    return query.execute()
 